@@ -1,8 +1,18 @@
+import io
+import logging
+import math
+import os
+import uuid
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+import lossratio_engine as engine
+import lossratio_statistics as statistics
+
 st.set_page_config(
     page_title="Dashboard Analisa LR by Kategori Okupasi",
     page_icon="📊",
@@ -13,259 +23,707 @@ st.set_page_config(
 st.markdown("# 📊 Dashboard Analisa Loss Ratio Berdasarkan Kategori Okupasi")
 st.markdown("""
     <div style='text-align: justify'>
-    📍 Untuk pengalaman yang lebih baik, tutup kembali sidebar setelah mengaplikasikan filter dan 
-    membuat tampilan menjadi wide mode. Direkomendasikan juga untuk membuka menggunakan Laptop/PC
+    📍 Untuk pengalaman yang lebih baik, buat tampilan menjadi wide mode. Filter data tersedia di panel
+    Filter Data setelah ketiga file diunggah. Direkomendasikan juga untuk membuka menggunakan Laptop/PC
     </div>
 """, unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
 
-# Fungsi untuk baca dan bersihkan file Excel
-def read_excel(file):
-    df = pd.read_excel(file)
-    df = df.drop(columns=[col for col in df.columns if str(col).startswith("Unnamed")])
+# Batas cache ingestion: 3 sumber x beberapa versi file, entri terlama dibuang otomatis
+CACHE_MAX_ENTRIES = 12
+CACHE_TTL = "6h"
+# Jumlah hasil agregasi per kombinasi filter yang disimpan (lintas session)
+RESULT_CACHE_MAX_ENTRIES = 64
+# Jumlah dataset bersama yang disimpan di memori proses (dipakai bersama oleh semua session)
+SHARED_DATASET_MAX_ENTRIES = int(os.environ.get("LR_SHARED_DATASETS", 4))
+
+# Log performa terstruktur: engine menulis satu baris JSON per tahap ke logger "lossratio".
+# Seperti --perf-log di batch CLI, log per tahap bersifat opt-in: aktif dengan
+# LR_PERF_LOG_LEVEL=INFO; panel performa di sidebar tetap tersedia tanpa log ini.
+if not engine.logger.handlers:
+    perf_handler = logging.StreamHandler()
+    perf_handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    engine.logger.addHandler(perf_handler)
+    engine.logger.setLevel(os.environ.get("LR_PERF_LOG_LEVEL", "WARNING"))
+    engine.logger.propagate = False
+
+# Catatan performa disimpan per session; setiap rerun (dan rerun fragment) diberi nomor run
+perf_log = st.session_state.setdefault('perf_log', engine.PerfLog(session=uuid.uuid4().hex[:8]))
+perf_log.start_run("app")
+
+# Hash isi file upload, dipakai sebagai kunci cache
+def file_hash(file):
+    return engine.content_hash(file.getvalue())
+
+def snapshot_label(path):
+    modified = pd.Timestamp(os.path.getmtime(path), unit="s").strftime("%Y-%m-%d %H:%M")
+    return f"{os.path.basename(path)} ({modified})"
+
+# st.dataframe yang dicatat di log performa
+def render_dataframe(name, df, **kwargs):
+    with engine.stage("dataframe", name, rows_in=len(df)) as record:
+        st.dataframe(df, **kwargs)
+        record['rows_out'] = len(df)
+
+# Baca, bersihkan dan deduplikasi satu sumber data.
+# Hasil di-cache berdasarkan hash isi file (lintas rerun dan lintas session),
+# sehingga file yang sama hanya di-parse sekali. Jika snapshot diaktifkan,
+# file Excel hanya di-parse sekali lalu selanjutnya dibaca dari Parquet.
+# Mode streaming membaca file per chunk dengan memori terbatas. _source_df diisi
+# hasil read_source dari mode paralel sehingga file tidak dibaca ulang.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Membaca file Excel...")
+def load_source(content_hash, _file_bytes, sumber_data, key_columns, use_snapshot=False, streaming=False,
+                _source_df=None):
+    path = engine.snapshot_path(sumber_data, content_hash)
+    if use_snapshot and os.path.exists(path):
+        return engine.read_snapshot(path)
+    if _source_df is not None:
+        df = _source_df
+    else:
+        df = engine.read_source(io.BytesIO(_file_bytes), sumber_data, key_columns, streaming)
+    if use_snapshot:
+        engine.write_snapshot(df, path)
+    loaded_sources().add((content_hash, sumber_data, use_snapshot, streaming))
     return df
 
+# Sumber yang sudah dihitung load_source di proses ini (lintas session), agar mode paralel
+# hanya mengirim file yang belum pernah dibaca ke process pool. Jika entri cache
+# load_source sudah kedaluwarsa, file tersebut dibaca ulang secara berurutan.
+@st.cache_resource(show_spinner=False)
+def loaded_sources():
+    return set()
+
+# Baca ketiga file di process pool dengan progress per file
+def read_sources_parallel(files):
+    progress = st.progress(0.0, text=f"⚡ Membaca {len(files)} file Excel secara paralel...")
+
+    def on_done(sumber_data, done, total):
+        progress.progress(done / total, text=f"✅ {sumber_data} selesai dibaca ({done}/{total})")
+
+    return engine.read_sources_parallel(files, on_done)
+
+# Seluruh data inkremental satu sumber; di-cache berdasarkan daftar part-nya
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def read_incremental(sumber_data, part_files):
+    return engine.read_incremental(part_files)
+
+# File Parquet yang isinya sama dengan satu sumber: snapshot yang dipilih, part data
+# inkremental, atau snapshot upload (jika snapshot diaktifkan). Backend DuckDB memindai file
+# ini alih-alih menyalin DataFrame pandas-nya; None jika sumber hanya ada di memori.
+def source_parquet(sumber_data, source_key, snapshot=None):
+    if snapshot:
+        return snapshot
+    if isinstance(source_key, tuple) and source_key[0] == 'incremental':
+        return [os.path.join(engine.INCREMENTAL_DIR, name) for name in source_key[2:]]
+    path = engine.snapshot_path(sumber_data, source_key)
+    return path if use_snapshot and os.path.exists(path) else None
+
+# Gabungkan upload ke data inkremental lalu kembalikan seluruh data, kunci dataset dan statistik
+def merge_incremental(sumber_data, content_hash, df, key_columns):
+    with engine.stage("incremental_merge", sumber_data, rows_in=len(df)) as record:
+        stats = engine.append_incremental(sumber_data, content_hash, df, key_columns)
+        record['rows_out'] = stats['new']
+    part_files = engine.incremental_part_files(sumber_data)
+    store_key = ('incremental', sumber_data) + part_files
+    return read_incremental(sumber_data, part_files), store_key, stats
+
+def report_incremental(sumber_data, stats):
+    st.success(
+        f"🔁 {sumber_data}: **{stats['new']:,}** baris baru, **{stats['duplicate']:,}** duplikat, "
+        f"**{stats['changed']:,}** berubah dibanding data yang sudah tersimpan."
+    )
+
+# Pilihan snapshot tersimpan sebagai pengganti upload file
+def select_snapshot(sumber_data, key):
+    paths = engine.list_snapshots(sumber_data)
+    if not paths:
+        return None
+    return st.selectbox(
+        f"🗂️ Atau pilih snapshot {sumber_data} yang tersimpan",
+        paths,
+        index=None,
+        format_func=snapshot_label,
+        key=f"snapshot_{key}",
+    )
+
+use_snapshot = st.checkbox(
+    "💾 Simpan data sebagai snapshot Parquet (file yang sama berikutnya dibaca dari snapshot)",
+    key="use_snapshot",
+)
+streaming = st.checkbox(
+    "🌊 Mode streaming (baca Excel per chunk, hemat memori untuk file besar)",
+    key="streaming",
+)
+incremental = st.checkbox(
+    "🔁 Mode inkremental (gabungkan upload dengan data yang sudah tersimpan, deduplikasi terhadap histori)",
+    key="incremental",
+)
+# Data inkremental dipakai bersama semua session: penghapusan memakai lock engine dan hanya
+# membersihkan cache data inkremental serta dataset session ini, bukan seluruh cache
+if incremental and st.button("🗑️ Hapus data inkremental yang tersimpan (berlaku untuk semua pengguna)"):
+    engine.clear_incremental()
+    read_incremental.clear()
+    st.session_state.pop('dataset', None)
+policy_join = st.checkbox(
+    "🔗 Gabungkan Premi, Klaim dan OS Klaim per polis (join) alih-alih ditumpuk",
+    key="policy_join",
+)
+warm_up = st.checkbox(
+    "🔥 Warm-up hasil (hitung awal setiap filter satu nilai TOC, Kategori Okupasi dan Risiko Okupasi setelah upload)",
+    key="warm_up",
+)
+parallel = st.checkbox(
+    "⚡ Mode paralel (ketiga file di-parse bersamaan setelah semuanya diunggah; tidak berlaku untuk mode streaming)",
+    key="parallel",
+)
+
+# Dataset bersama yang sudah terdaftar bisa dipilih sebagai pengganti upload ketiga file
+shared_datasets = {manifest['path']: manifest for manifest in engine.list_datasets()}
+shared_dataset_path = st.selectbox(
+    "📚 Pilih dataset bersama (tanpa upload)",
+    list(shared_datasets),
+    index=None,
+    format_func=lambda path: "{name} (v{version}, {created})".format(**shared_datasets[path]),
+    key="shared_dataset",
+) if shared_datasets else None
+shared_dataset = shared_datasets.get(shared_dataset_path)
+
+# Mode paralel: file yang belum ada di cache load_source (dari session mana pun) dibaca
+# bersamaan. Nilai uploader diambil dari session_state karena ketiga widget baru dirender di bawah.
+parallel_sources = {}
+if parallel and not streaming and shared_dataset is None:
+    uploads = {
+        sumber_data: (st.session_state.get(key), key_columns)
+        for sumber_data, key, key_columns in [
+            ('Premi', 'premi', engine.key_columns_premi),
+            ('Klaim', 'klaim', engine.key_columns_klaim),
+            ('OS Klaim', 'os', engine.key_columns_osklaim),
+        ]
+    }
+    if all(file for file, _ in uploads.values()):
+        pending = {}
+        for sumber_data, (file, key_columns) in uploads.items():
+            content_hash = file_hash(file)
+            if (content_hash, sumber_data, use_snapshot, False) in loaded_sources():
+                continue
+            if use_snapshot and os.path.exists(engine.snapshot_path(sumber_data, content_hash)):
+                continue
+            pending[sumber_data] = (file.getvalue(), key_columns)
+        if pending:
+            parallel_sources = read_sources_parallel(pending)
+
 # Upload dan preview data
 # 1. Premi
-file_premi = st.file_uploader("📂 Upload Data Premi (Excel)", type="xlsx", key="premi")
+df_premi = None
+file_premi = st.file_uploader("📂 Upload Data Premi (Excel)", type="xlsx", key="premi") if shared_dataset is None else None
+snapshot_premi = select_snapshot('Premi', 'premi') if use_snapshot and not file_premi and shared_dataset is None else None
 if file_premi:
-    df_premi = read_excel(file_premi)
-    df_premi['Sumber Data'] = 'Premi'
-    # Deduplikasi berdasarkan key_columns_premi
-    key_columns_premi = ['NO POLIS', 'NO SERTIFIKAT', 'INSURED NAME']
-    df_premi = df_premi.drop_duplicates(subset=key_columns_premi, keep='first')
+    # Baca + deduplikasi berdasarkan key_columns_premi (cached per hash file)
+    source_key_premi = file_hash(file_premi)
+    df_premi = load_source(source_key_premi, file_premi.getvalue(), 'Premi', engine.key_columns_premi, use_snapshot, streaming,
+                           parallel_sources.get('Premi'))
+    if incremental:
+        df_premi, source_key_premi, stats_premi = merge_incremental('Premi', source_key_premi, df_premi, engine.key_columns_premi)
+        report_incremental('Premi', stats_premi)
+elif snapshot_premi:
+    source_key_premi = os.path.basename(snapshot_premi)
+    df_premi = engine.read_snapshot(snapshot_premi)
+if df_premi is not None:
     st.write("### 1️⃣ Preview Data Premi")
     st.info(f"🔍 Data Premi memiliki **{len(df_premi):,} baris setelah deduplikasi.**")
-    st.dataframe(df_premi.head(), hide_index=True)
+    if 'peak_memory' in df_premi.attrs:
+        st.caption(f"Memori puncak saat streaming: {df_premi.attrs['peak_memory'] / 2**20:,.0f} MB")
+    render_dataframe("Preview Premi", df_premi.head(), hide_index=True)
 
 # 2. Klaim
-file_klaim = st.file_uploader("📂 Upload Data Klaim (Excel)", type="xlsx", key="klaim")
+df_klaim = None
+file_klaim = st.file_uploader("📂 Upload Data Klaim (Excel)", type="xlsx", key="klaim") if shared_dataset is None else None
+snapshot_klaim = select_snapshot('Klaim', 'klaim') if use_snapshot and not file_klaim and shared_dataset is None else None
 if file_klaim:
-    df_klaim = read_excel(file_klaim)
-    df_klaim['Sumber Data'] = 'Klaim'
-    # Deduplikasi berdasarkan key_columns_klaim
-    key_columns_klaim = ['NO KLAIM', 'CLAIM AMOUNT (IDR)']
-    df_klaim = df_klaim.drop_duplicates(subset=key_columns_klaim, keep='first')
+    # Baca + deduplikasi berdasarkan key_columns_klaim (cached per hash file)
+    source_key_klaim = file_hash(file_klaim)
+    df_klaim = load_source(source_key_klaim, file_klaim.getvalue(), 'Klaim', engine.key_columns_klaim, use_snapshot, streaming,
+                           parallel_sources.get('Klaim'))
+    if incremental:
+        df_klaim, source_key_klaim, stats_klaim = merge_incremental('Klaim', source_key_klaim, df_klaim, engine.key_columns_klaim)
+        report_incremental('Klaim', stats_klaim)
+elif snapshot_klaim:
+    source_key_klaim = os.path.basename(snapshot_klaim)
+    df_klaim = engine.read_snapshot(snapshot_klaim)
+if df_klaim is not None:
     st.write("### 2️⃣ Preview Data Klaim")
     st.info(f"🔍 Data Klaim memiliki **{len(df_klaim):,} baris setelah deduplikasi.**")
-    st.dataframe(df_klaim.head(), hide_index=True)
+    if 'peak_memory' in df_klaim.attrs:
+        st.caption(f"Memori puncak saat streaming: {df_klaim.attrs['peak_memory'] / 2**20:,.0f} MB")
+    render_dataframe("Preview Klaim", df_klaim.head(), hide_index=True)
 
 # 3. OS Klaim
-file_os = st.file_uploader("📂 Upload Data Outstanding Klaim (Excel)", type="xlsx", key="os")
+df_os_klaim = None
+file_os = st.file_uploader("📂 Upload Data Outstanding Klaim (Excel)", type="xlsx", key="os") if shared_dataset is None else None
+snapshot_os = select_snapshot('OS Klaim', 'os') if use_snapshot and not file_os and shared_dataset is None else None
 if file_os:
-    df_os_klaim = read_excel(file_os)
-    df_os_klaim['Sumber Data'] = 'OS Klaim'
-    # Deduplikasi berdasarkan key_columns_osklaim
-    key_columns_osklaim = ['INSURED NAME']
-    df_os_klaim = df_os_klaim.drop_duplicates(subset=key_columns_osklaim, keep='first')
+    # Baca + deduplikasi berdasarkan key_columns_osklaim (cached per hash file)
+    source_key_os = file_hash(file_os)
+    df_os_klaim = load_source(source_key_os, file_os.getvalue(), 'OS Klaim', engine.key_columns_osklaim, use_snapshot, streaming,
+                              parallel_sources.get('OS Klaim'))
+    if incremental:
+        df_os_klaim, source_key_os, stats_os = merge_incremental('OS Klaim', source_key_os, df_os_klaim, engine.key_columns_osklaim)
+        report_incremental('OS Klaim', stats_os)
+elif snapshot_os:
+    source_key_os = os.path.basename(snapshot_os)
+    df_os_klaim = engine.read_snapshot(snapshot_os)
+if df_os_klaim is not None:
     st.write("### 3️⃣ Preview Data Outstanding Klaim")
     st.info(f"🔍 Data OS Klaim memiliki **{len(df_os_klaim):,} baris setelah deduplikasi.**")
-    st.dataframe(df_os_klaim.head(), hide_index=True)
-
-# Daftar kolom
-desired_columns = [
-    'AY', 'UY', 'TOC_MOD', 'Kategori Okupasi', 'Kategori Risiko Okupasi',
-    'INSURED NAME', 'NO POLIS', 'NO SERTIFIKAT', 'NO KLAIM',
-    'INCEPTION DATE', 'EXPIRY DATE', 'Sumber Data'
-]
-additional_columns = [
-    'Premi Gross', 'Akuisisi', 'Premi Reas', 'Komisi Reas',
-    'Paid Claim', 'Recovery Klaim Reas', 'OS Claim', 'Recovery OS Claim Reas'
-]
-
-# Proses data jika semua file diunggah
-if file_premi and file_klaim and file_os:
-    # Rename kolom
-    df_premi = df_premi.rename(columns={
-        'PREMI IDR': 'Premi Gross',
-        'AKUISISI': 'Akuisisi',
-        'PREMI REAS IDR': 'Premi Reas',
-        'KOMISI REAS IDR': 'Komisi Reas'
-    })
-    df_klaim = df_klaim.rename(columns={
-        'CLAIM AMOUNT (IDR)': 'Paid Claim',
-        'KLAIM REAS': 'Recovery Klaim Reas'
-    })
-    df_os_klaim = df_os_klaim.rename(columns={
-        'Gross OS Klaim': 'OS Claim',
-        'Reas': 'Recovery OS Claim Reas'
-    })
+    if 'peak_memory' in df_os_klaim.attrs:
+        st.caption(f"Memori puncak saat streaming: {df_os_klaim.attrs['peak_memory'] / 2**20:,.0f} MB")
+    render_dataframe("Preview OS Klaim", df_os_klaim.head(), hide_index=True)
 
-    # Gabungkan dataframe setelah deduplikasi
-    df_combined = pd.concat([df_premi, df_klaim, df_os_klaim], ignore_index=True)
-
-    # Normalisasi kolom untuk konsistensi
-    for col in desired_columns:
-        if col in df_combined.columns:
-            df_combined[col] = df_combined[col].astype(str).str.strip()
-            df_combined[col] = df_combined[col].replace(['nan', 'None'], pd.NA)
-
-    # Tambahkan kolom tambahan jika tidak ada
-    for col in additional_columns:
-        if col not in df_combined.columns:
-            df_combined[col] = pd.NA
-
-    # Pilih kolom yang diinginkan
-    final_columns = [col for col in desired_columns if col in df_combined.columns] + additional_columns
-    df_combined = df_combined[final_columns]
-    df_combined = df_combined.rename(columns={"TOC_MOD": "TOC"})
-
-    # Konversi kolom tanggal
-    df_combined['INCEPTION DATE'] = pd.to_datetime(df_combined['INCEPTION DATE'], errors='coerce')
-    df_combined['EXPIRY DATE'] = pd.to_datetime(df_combined['EXPIRY DATE'], errors='coerce')
-
-    # Sidebar untuk filter
-    st.sidebar.header("Filter Data")
-
-    # Filter TOC
-    toc_options = sorted(df_combined['TOC'].dropna().unique())
-    selected_toc = st.sidebar.multiselect("Pilih TOC", toc_options)
-
-    # Filter Kategori Okupasi
-    kategori_okupasi_options = sorted(df_combined['Kategori Okupasi'].dropna().unique())
-    selected_kategori_okupasi = st.sidebar.multiselect("Pilih Kategori Okupasi", kategori_okupasi_options)
-
-    # Filter Kategori Risiko Okupasi
-    risiko_okupasi_options = sorted(df_combined['Kategori Risiko Okupasi'].dropna().unique())
-    selected_risiko_okupasi = st.sidebar.multiselect("Pilih Kategori Risiko Okupasi", risiko_okupasi_options)
-
-    # Filter Date Range
-    st.sidebar.subheader("Pilih Rentang Tanggal")
-    date_filter = st.sidebar.radio("Filter Berdasarkan", ["INCEPTION DATE", "EXPIRY DATE"])
-    min_date = min(df_combined[date_filter].min(), df_combined[date_filter].min())
-    max_date = max(df_combined[date_filter].max(), df_combined[date_filter].max())
-    date_range = st.sidebar.date_input("Pilih Rentang Tanggal", [], min_value=min_date, max_value=max_date)
-
-    # Terapkan filter
-    filtered_df = df_combined.copy()
-    if selected_toc:
-        filtered_df = filtered_df[filtered_df['TOC'].isin(selected_toc)]
-    if selected_kategori_okupasi:
-        filtered_df = filtered_df[filtered_df['Kategori Okupasi'].isin(selected_kategori_okupasi)]
-    if selected_risiko_okupasi:
-        filtered_df = filtered_df[filtered_df['Kategori Risiko Okupasi'].isin(selected_risiko_okupasi)]
-    if date_range and len(date_range) == 2:
-        start_date, end_date = date_range
-        if date_filter == "INCEPTION DATE":
-            filtered_df = filtered_df[
-                (filtered_df['INCEPTION DATE'] >= pd.to_datetime(start_date)) &
-                (filtered_df['INCEPTION DATE'] <= pd.to_datetime(end_date))
-            ]
+# Versi cached dari tahap engine yang mahal, satu kali per dataset
+# (dataset_key = hash ketiga file)
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def combine_sources(dataset_key, _df_premi, _df_klaim, _df_os_klaim):
+    return engine.combine_sources(_df_premi, _df_klaim, _df_os_klaim)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def build_policy_fact(dataset_key, _df):
+    return engine.build_policy_fact(_df)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def build_cube(dataset_key, _df):
+    return engine.build_cube(_df)
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def build_filter_index(dataset_key, _df):
+    return engine.FilterIndex(_df)
+
+# Backend agregasi pandas atas data gabungan beserta cube, index filter dan triangle-nya
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def build_backend(dataset_key, _df, _cube, _filter_index, _triangle):
+    return engine.PandasBackend(_df, _cube, _filter_index, _triangle)
+
+# Backend DuckDB dimuat langsung dari sumber (file Parquet, DataFrame hasil read_source atau
+# fact table hasil join per polis); data gabungan, cube dan index filter pandas tidak dibangun
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Memuat data ke DuckDB...")
+def build_duckdb_backend(dataset_key, _sources):
+    return engine.DuckDBBackend(_sources)
+
+# Format tanggal diatur di column config, bukan dengan strftime ke salinan dataframe
+date_column_config = {
+    'INCEPTION DATE': st.column_config.DateColumn(format="YYYY-MM-DD"),
+    'EXPIRY DATE': st.column_config.DateColumn(format="YYYY-MM-DD"),
+}
+
+# Format nominal (pemisah ribuan, 2 desimal) lewat column config
+amount_column_config = {
+    col: st.column_config.NumberColumn(format="accounting") for col in engine.additional_columns
+}
+
+# Tick sumbu Y dengan jarak 1/2/5 x 10^n, sekitar n_ticks buah yang mencakup
+# rentang nilai (selalu termasuk 0)
+def nice_ticks(values, n_ticks=6):
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return []
+    low, high = min(values.min(), 0.0), max(values.max(), 0.0)
+    if high == low:
+        return [0.0]
+    raw_step = (high - low) / n_ticks
+    magnitude = 10 ** np.floor(np.log10(raw_step))
+    step = magnitude * min(m for m in (1, 2, 5, 10) if m * magnitude >= raw_step)
+    return (np.arange(np.floor(low / step), np.ceil(high / step) + 1) * step).tolist()
+
+# Grid data berhalaman: pengurutan dilakukan backend (pandas atau SQL LIMIT/OFFSET) dan
+# hanya baris pada halaman aktif yang dikirim ke browser
+def render_data_grid(dataset, filters, key, page_size_options=(50, 100, 500, 1000)):
+    backend = dataset['backend']
+    col_sort, col_order, col_size, col_page = st.columns(4)
+    sort_column = col_sort.selectbox(
+        "Urutkan berdasarkan", [None] + backend.columns,
+        format_func=lambda col: "-" if col is None else col, key=f"{key}_sort"
+    )
+    sort_order = col_order.radio("Urutan", ["Naik", "Turun"], horizontal=True, key=f"{key}_order")
+    page_size = col_size.selectbox("Baris per halaman", page_size_options, key=f"{key}_page_size")
+    n_rows = filtered_view(dataset['key'], 'count', filters, (), backend)
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    page = col_page.number_input(f"Halaman (dari {n_pages:,})", min_value=1, max_value=n_pages,
+                                 value=1, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    page_df = filtered_view(dataset['key'], 'page', filters, (sort_column, sort_order == "Naik", start, page_size),
+                            backend)
+    with engine.stage("dataframe", key, rows_in=n_rows) as record:
+        st.dataframe(page_df, hide_index=True, column_config=date_column_config)
+        record['rows_out'] = len(page_df)
+    st.caption(f"Menampilkan baris {min(start + 1, n_rows):,}–{start + len(page_df):,} dari {n_rows:,} baris.")
+    return n_rows
+
+# Memo hasil agregasi per versi dataset + kombinasi filter (+ Top N dan drill-down).
+# Berpindah kembali ke filter yang pernah dipakai tidak menghitung ulang; entri
+# terlama dibuang setelah RESULT_CACHE_MAX_ENTRIES (LRU) atau CACHE_TTL.
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def aggregate_view(dataset_key, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi, date_filter,
+                   date_range, top_n, drill_down, _backend):
+    filters = dict(selected_toc=selected_toc, selected_kategori_okupasi=selected_kategori_okupasi,
+                   selected_risiko_okupasi=selected_risiko_okupasi, date_filter=date_filter, date_range=date_range)
+    return _backend.aggregate(filters, top_n, drill_down)
+
+# Statistik severity dan frekuensi klaim, di-memo dengan kunci yang sama seperti aggregate_view
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def claim_statistics_view(dataset_key, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi, date_filter,
+                          date_range, thresholds, _backend):
+    filters = dict(selected_toc=selected_toc, selected_kategori_okupasi=selected_kategori_okupasi,
+                   selected_risiko_okupasi=selected_risiko_okupasi, date_filter=date_filter, date_range=date_range)
+    return statistics.backend_claim_statistics(_backend, filters, thresholds)
+
+# Tampilan backend lain yang bergantung pada filter, dengan argumennya masing-masing
+# (halaman grid, tanggal valuasi, periode). Semuanya berukuran terbatas berapa pun jumlah
+# baris data; nilai severity mentah (satu nilai per polis/klaim) tidak di-memo.
+filtered_views = ('distinct', 'count', 'page', 'describe', 'earned_loss_ratio', 'earned_premium_by_period',
+                  'earned_loss_ratio_by_year', 'triangle_cells', 'insured_density')
+
+# Memo tampilan di atas dengan kunci yang sama seperti aggregate_view (+ nama dan argumen
+# tampilan). Hit tidak memanggil backend sama sekali: seleksi PandasBackend baru dibuat saat
+# tampilan pertama yang tidak ada di memo memintanya, sehingga berpindah ke filter yang semua
+# tampilannya sudah di memo tidak menjalankan select_rows maupun query SQL.
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES * len(filtered_views), ttl=CACHE_TTL, show_spinner=False)
+def filtered_view(dataset_key, view, filters, args, _backend):
+    return getattr(_backend, view)(filters, *args)
+
+# Histogram severity (n_bins batang + kuantil) per filter dan basis: yang di-memo hanya
+# ringkasannya, bukan array nilai severity mentah
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def severity_view(dataset_key, filters, basis, _backend):
+    return engine.severity_histogram(_backend.severity_values(filters, basis))
+
+# Pilihan filter dan batas tanggal (tanpa filter), sekali per versi dataset
+@st.cache_data(max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def dataset_view(dataset_key, view, args, _backend):
+    return getattr(_backend, view)(*args)
+
+# Tanggal valuasi bawaan: hari ini, dibatasi rentang polis
+def default_valuation_date(first_inception, last_expiry):
+    return min(max(pd.Timestamp.today().normalize(), first_inception), last_expiry)
+
+# Pilihan batas large loss (IDR)
+large_loss_options = [10_000_000, 50_000_000, 100_000_000, 500_000_000, 1_000_000_000, 5_000_000_000]
+
+# Warm-up: hitung awal tampilan setiap filter satu nilai per dimensi kategori, dengan
+# pengaturan bawaan panel filter (tanpa rentang tanggal, Top 10, tanpa drill-down): agregasi,
+# halaman pertama grid, statistik deskriptif, statistik klaim dan loss ratio earned
+def warm_up_views(dataset):
+    backend = dataset['backend']
+    dimensions = [('TOC', 0), ('Kategori Okupasi', 1), ('Kategori Risiko Okupasi', 2)]
+    views = [(position, value) for col, position in dimensions
+             for value in dataset_view(dataset['key'], 'options', (col,), backend)]
+    valuation_date = default_valuation_date(
+        dataset_view(dataset['key'], 'date_bounds', ('INCEPTION DATE',), backend)[0],
+        dataset_view(dataset['key'], 'date_bounds', ('EXPIRY DATE',), backend)[1]
+    ).date()
+    progress = st.progress(0.0, text=f"🔥 Warm-up {len(views)} tampilan...")
+    for done, (position, value) in enumerate(views, start=1):
+        selected = [[], [], []]
+        selected[position] = [value]
+        filters = dict(selected_toc=selected[0], selected_kategori_okupasi=selected[1],
+                       selected_risiko_okupasi=selected[2], date_filter="INCEPTION DATE", date_range=())
+        aggregate_view(dataset['key'], *selected, "INCEPTION DATE", (), 10, None, backend)
+        filtered_view(dataset['key'], 'count', filters, (), backend)
+        filtered_view(dataset['key'], 'page', filters, (None, True, 0, 50), backend)
+        filtered_view(dataset['key'], 'describe', filters, (), backend)
+        claim_statistics_view(dataset['key'], *selected, "INCEPTION DATE", (),
+                              tuple(sorted(statistics.LARGE_LOSS_THRESHOLDS)), backend)
+        filtered_view(dataset['key'], 'earned_loss_ratio', filters, (valuation_date,), backend)
+        progress.progress(done / len(views), text=f"🔥 Warm-up {done}/{len(views)} tampilan")
+    progress.empty()
+
+# Kelompok grafik yang bisa dibuka/tutup
+chart_sections = ["Top Insured", "Summary by Premi", "Summary by Klaim", "Histogram UY", "Triangle LR", "Earned Premium",
+                  "Distribusi Severity"]
+
+# Kunci sumber inkremental yang sama dengan kunci sebelumnya ditambah part baru
+def extends_incremental(previous_key, key):
+    return (
+        isinstance(previous_key, tuple) and isinstance(key, tuple) and
+        previous_key[0] == key[0] == 'incremental' and key[:len(previous_key)] == previous_key
+    )
+
+# Triangle LR. Pada mode inkremental part lama tidak berubah dan selalu berada di awal
+# tiap sumber, sehingga triangle baru cukup dibangun dari cell triangle dataset sebelumnya
+# ditambah baris dari part baru (triangle sebelumnya tetap utuh untuk backend-nya);
+# selain itu (atau pada join per polis) triangle dibangun dari seluruh data.
+def build_triangle(previous, source_keys, source_rows, df_combined, policy_join):
+    if (previous is not None and previous['triangle'] is not None and not policy_join and
+            not previous['policy_join'] and
+            all(extends_incremental(*keys) for keys in zip(previous['source_keys'], source_keys))):
+        positions = []
+        offset = 0
+        for previous_rows, rows in zip(previous['source_rows'], source_rows):
+            positions.append(np.arange(offset + previous_rows, offset + rows))
+            offset += rows
+        return previous['triangle'].update(df_combined.take(np.concatenate(positions)))
+    return engine.LossTriangle().update(df_combined)
+
+# Dataset gabungan beserta cube dan index filter disimpan di session_state. Fragment
+# analitik di bawah memakai objek yang sama setiap rerun tanpa membaca ulang cache;
+# dataset baru hanya dibangun jika kunci dataset (hash ketiga file) berubah.
+# Backend dipilih dari jumlah baris sumber sebelum objek pandas dibangun: dataset besar
+# (tanpa join per polis) langsung dimuat ke DuckDB dan semua tampilan dilayani lewat SQL.
+def load_dataset(source_keys, df_premi, df_klaim, df_os_klaim, policy_join, source_paths=None):
+    dataset_key = source_keys + (('policy_join',) if policy_join else ())
+    dataset = st.session_state.get('dataset')
+    if dataset is None or dataset['key'] != dataset_key:
+        source_rows = (len(df_premi), len(df_klaim), len(df_os_klaim))
+        df_combined = cube = filter_index = triangle = None
+        match_rates = None
+        join_error = None
+        if engine.use_duckdb(sum(source_rows)) and not policy_join:
+            # Sumber yang punya file Parquet dipindai langsung dari file tersebut
+            sources = {'Premi': df_premi, 'Klaim': df_klaim, 'OS Klaim': df_os_klaim}
+            backend = build_duckdb_backend(dataset_key, {
+                sumber_data: (source_paths or {}).get(sumber_data) or df for sumber_data, df in sources.items()
+            })
         else:
-            filtered_df = filtered_df[
-                (filtered_df['EXPIRY DATE'] >= pd.to_datetime(start_date)) &
-                (filtered_df['EXPIRY DATE'] <= pd.to_datetime(end_date))
-            ]
+            # Rename kolom, gabungkan dataframe setelah deduplikasi dan normalisasi sesuai skema
+            df_combined = combine_sources(source_keys, df_premi, df_klaim, df_os_klaim)
+            # Join tingkat polis sebagai pengganti data yang ditumpuk; jika kunci polis tidak
+            # tersedia, data tetap ditumpuk dan peringatannya ditampilkan
+            if policy_join:
+                try:
+                    df_combined, match_rates = build_policy_fact(source_keys, df_combined)
+                except ValueError as error:
+                    join_error = str(error)
+            # Join per polis selalu dibangun di pandas; backend dipilih dari ukuran fact table
+            if engine.use_duckdb(len(df_combined)):
+                backend = build_duckdb_backend(dataset_key, {'Fakta': df_combined})
+                df_combined = None
+            else:
+                cube = build_cube(dataset_key, df_combined)
+                filter_index = build_filter_index(dataset_key, df_combined)
+                triangle = build_triangle(dataset, source_keys, source_rows, df_combined, match_rates is not None)
+                backend = build_backend(dataset_key, df_combined, cube, filter_index, triangle)
+        dataset = {
+            'key': dataset_key,
+            'source_keys': source_keys,
+            'source_rows': source_rows,
+            'policy_join': match_rates is not None,
+            'df': df_combined,
+            'cube': cube,
+            'filter_index': filter_index,
+            'backend': backend,
+            'triangle': triangle,
+            'match_rates': match_rates,
+            'join_error': join_error,
+        }
+        st.session_state['dataset'] = dataset
+    return dataset
+
+# Dataset bersama dibangun sekali per proses (cache_resource) dan objek yang sama dipakai
+# semua session tanpa disalin, sehingga memori bertambah per dataset, bukan per pengguna.
+# Dataset terlama dibuang dari cache (LRU) setelah SHARED_DATASET_MAX_ENTRIES; session
+# yang masih memakainya tetap memegang referensinya sampai berganti dataset.
+# Objek ini hanya boleh dibaca. Dataset besar di-query DuckDB langsung dari file Parquet
+# versinya, tanpa dibaca ke pandas maupun disalin.
+@st.cache_resource(max_entries=SHARED_DATASET_MAX_ENTRIES, show_spinner="Memuat dataset bersama...")
+def load_shared_dataset(path, policy_join):
+    manifest = engine.dataset_manifest(path)
+    source_keys = (('dataset', path),) * 3
+    source_rows = tuple(manifest['rows'][sumber_data] for sumber_data in engine.dataset_sources)
+    dataset_key = source_keys + (('policy_join',) if policy_join else ())
+    df_combined = cube = filter_index = triangle = None
+    match_rates = None
+    join_error = None
+    if engine.use_duckdb(sum(source_rows)) and not policy_join:
+        backend = engine.DuckDBBackend(engine.dataset_source_paths(path))
+    else:
+        sources = engine.read_dataset(path)
+        df_combined = engine.combine_sources(sources['Premi'], sources['Klaim'], sources['OS Klaim'])
+        if policy_join:
+            try:
+                df_combined, match_rates = engine.build_policy_fact(df_combined)
+            except ValueError as error:
+                join_error = str(error)
+        if engine.use_duckdb(len(df_combined)):
+            backend = engine.DuckDBBackend({'Fakta': df_combined})
+            df_combined = None
+        else:
+            cube = engine.build_cube(df_combined)
+            filter_index = engine.FilterIndex(df_combined)
+            triangle = engine.LossTriangle().update(df_combined)
+            backend = engine.PandasBackend(df_combined, cube, filter_index, triangle)
+    return {
+        'key': dataset_key,
+        'source_keys': source_keys,
+        'source_rows': source_rows,
+        'policy_join': match_rates is not None,
+        'df': df_combined,
+        'cube': cube,
+        'filter_index': filter_index,
+        'backend': backend,
+        'triangle': triangle,
+        'match_rates': match_rates,
+        'join_error': join_error,
+    }
+
+# Simpan ketiga sumber yang sedang dipakai sebagai versi baru dataset bersama
+def publish_shared_dataset(sources):
+    with st.form("publish_dataset"):
+        name = st.text_input("Nama dataset bersama", placeholder="mis. Closing 2026-09")
+        if st.form_submit_button("📤 Simpan sebagai dataset bersama") and name.strip():
+            path = engine.publish_dataset(name, sources)
+            st.success(f"📚 Dataset **{name.strip()}** tersimpan ({os.path.basename(path)}) dan bisa dipilih "
+                       "oleh pengguna lain tanpa upload.")
+
+# Filter dan analitik dijalankan sebagai fragment: perubahan filter hanya menjalankan
+# ulang bagian ini, bukan upload, deduplikasi dan preview di atasnya.
+# (st.sidebar tidak bisa dipakai di dalam fragment, sehingga filter ada di panel ini.)
+@st.fragment
+def render_analytics():
+    if perf_log.context['scope'] != "app":
+        perf_log.start_run("fragment")
+    dataset = st.session_state['dataset']
+    backend = dataset['backend']
+
+    with st.expander("🔎 Filter Data", expanded=True):
+        col_toc, col_okupasi, col_risiko, col_tanggal = st.columns(4)
 
-    # Format tanggal untuk display
-    filtered_df_display = filtered_df.copy()
-    if 'INCEPTION DATE' in filtered_df_display.columns:
-        filtered_df_display['INCEPTION DATE'] = filtered_df_display['INCEPTION DATE'].dt.strftime('%Y-%m-%d')
-    if 'EXPIRY DATE' in filtered_df_display.columns:
-        filtered_df_display['EXPIRY DATE'] = filtered_df_display['EXPIRY DATE'].dt.strftime('%Y-%m-%d')
+        # Filter TOC
+        toc_options = dataset_view(dataset['key'], 'options', ('TOC',), backend)
+        selected_toc = col_toc.multiselect("Pilih TOC", toc_options)
+
+        # Filter Kategori Okupasi
+        kategori_okupasi_options = dataset_view(dataset['key'], 'options', ('Kategori Okupasi',), backend)
+        selected_kategori_okupasi = col_okupasi.multiselect("Pilih Kategori Okupasi", kategori_okupasi_options)
+
+        # Filter Kategori Risiko Okupasi
+        risiko_okupasi_options = dataset_view(dataset['key'], 'options', ('Kategori Risiko Okupasi',), backend)
+        selected_risiko_okupasi = col_risiko.multiselect("Pilih Kategori Risiko Okupasi", risiko_okupasi_options)
+
+        # Filter Date Range
+        date_filter = col_tanggal.radio("Filter Berdasarkan", ["INCEPTION DATE", "EXPIRY DATE"], horizontal=True)
+        min_date, max_date = dataset_view(dataset['key'], 'date_bounds', (date_filter,), backend)
+        date_range = col_tanggal.date_input("Pilih Rentang Tanggal", [], min_value=min_date, max_value=max_date)
+
+        # Filter diterapkan backend: index bitmap + cube (pandas) atau klausa WHERE (DuckDB)
+        filters = dict(selected_toc=selected_toc, selected_kategori_okupasi=selected_kategori_okupasi,
+                       selected_risiko_okupasi=selected_risiko_okupasi, date_filter=date_filter,
+                       date_range=date_range)
+
+        # Pengaturan Top N insured
+        col_top_n, col_drill, col_drill_value, col_valuasi = st.columns(4)
+        top_n = col_top_n.number_input("Jumlah insured teratas", min_value=1, max_value=100, value=10, step=1)
+        drill_column = col_drill.selectbox("Drill-down berdasarkan", [None, 'TOC', 'Kategori Okupasi'],
+                                           format_func=lambda col: "Semua" if col is None else col)
+        drill_down = None
+        if drill_column:
+            drill_value = col_drill_value.selectbox(f"Pilih {drill_column}",
+                                                    filtered_view(dataset['key'], 'distinct', filters, (drill_column,),
+                                                                  backend))
+            if drill_value is not None:
+                drill_down = (drill_column, drill_value)
+
+        # Tanggal valuasi untuk loss ratio basis earned (default hari ini, dibatasi rentang polis)
+        first_inception = dataset_view(dataset['key'], 'date_bounds', ('INCEPTION DATE',), backend)[0]
+        last_expiry = dataset_view(dataset['key'], 'date_bounds', ('EXPIRY DATE',), backend)[1]
+        valuation_date = col_valuasi.date_input(
+            "Tanggal valuasi (earned)", default_valuation_date(first_inception, last_expiry),
+            min_value=first_inception, max_value=last_expiry
+        )
+
+    # Agregasi lewat backend dataset (memo per kombinasi filter)
+    aggregates = aggregate_view(dataset['key'], selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+                                date_filter, date_range, top_n, drill_down, backend)
 
     st.write("### Preview Data Gabungan")
-    st.dataframe(filtered_df_display, hide_index=True)
-    st.info(f"🔍 Data yang ditampilkan memiliki **{len(filtered_df):,} baris.**")
+    n_rows = render_data_grid(dataset, filters, key="grid_gabungan")
+    st.info(f"🔍 Data yang ditampilkan memiliki **{n_rows:,} baris.**")
+    st.caption(f"Backend agregasi: {backend.name}")
 
     # Tabel summary berdasarkan UY
     st.write("### 📅 Summary Berdasarkan Underwriting Year (UY)")
-    summary_columns = [
-        'Premi Gross', 'Akuisisi', 'Premi Reas', 'Komisi Reas',
-        'Paid Claim', 'Recovery Klaim Reas', 'OS Claim', 'Recovery OS Claim Reas'
-    ]
-    summary_df = filtered_df.groupby('UY')[summary_columns].sum().reset_index()
-    summary_df = summary_df.sort_values('UY', ascending=True)
-    summary_df = summary_df.reset_index(drop=True)
-    summary_df.index = summary_df.index + 1
-
-    # Hitung Grand Total
-    grand_total = summary_df[summary_columns].sum()
-    grand_total_df = pd.DataFrame([grand_total], columns=summary_columns, index=['Grand Total'])
-    grand_total_df['UY'] = 'Grand Total'
-    summary_df = pd.concat([summary_df, grand_total_df], ignore_index=True)
-
-    # Format angka
-    for col in summary_columns:
-        summary_df[col] = summary_df[col].apply(lambda x: f"{x:,.2f}")
-
-    st.dataframe(summary_df, hide_index=True)
+    summary_df = engine.uy_summary_table(aggregates.summary_uy)
+
+    # Nilai tetap numerik; format angka diterapkan saat ditampilkan
+    render_dataframe("Summary UY", summary_df, hide_index=True, column_config=amount_column_config)
 
     st.write("# 📈 Informasi dan Statistik Deskriptif Data")
 
-    def simplify_number(value):
-        if value >= 1e12:
-            return f"{value / 1e12:.1f} T"
-        elif value >= 1e9:
-            return f"{value / 1e9:.1f} B"
-        elif value >= 1e6:
-            return f"{value / 1e6:.1f} M"
-        else:
-            return f"{value:,.0f}"
+    describe_df = filtered_view(dataset['key'], 'describe', filters, (), backend)
+    render_dataframe("Statistik Deskriptif", describe_df, use_container_width=True)
 
-    st.dataframe(filtered_df_display, use_container_width=True)
+    # Frekuensi dan severity klaim per TOC / Kategori Okupasi / Kategori Risiko Okupasi
+    st.write("#### Statistik Severity dan Frekuensi Klaim")
+    thresholds = st.multiselect("Batas large loss", large_loss_options,
+                                default=list(statistics.LARGE_LOSS_THRESHOLDS),
+                                format_func=lambda value: engine.simplify_numbers([value])[0],
+                                key="large_loss_thresholds")
+    claim_stats = claim_statistics_view(dataset['key'], selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+                                        date_filter, date_range, tuple(sorted(thresholds)), backend)
+    render_dataframe("Statistik Klaim", claim_stats, hide_index=True, use_container_width=True, column_config={
+        'Frekuensi Klaim': st.column_config.NumberColumn("Frekuensi Klaim (klaim/polis)", format="percent"),
+        **{col: st.column_config.NumberColumn(format="accounting")
+           for col in ['Rata-rata Severity', 'Median Severity', 'P90 Severity', 'P99 Severity', 'Severity Maks']},
+    })
 
-    # Hitung premi_sev dan klaim_sev
-    premi_sev = filtered_df_display.groupby("INSURED NAME")["Premi Gross"].sum().nlargest(10).reset_index()
-    premi_sev.columns = ["Insuredname", "Severity"]
-    klaim_sev = filtered_df_display.groupby("INSURED NAME")["Paid Claim"].sum().nlargest(10).reset_index()
-    klaim_sev.columns = ["Claimant", "Severity"]
-    premi_sev = premi_sev.sort_values(by="Severity", ascending=True).head(10)
-    klaim_sev = klaim_sev.sort_values(by="Severity", ascending=True).head(10)
-    premi_sev["Severity"] = premi_sev["Severity"].apply(simplify_number)
-    klaim_sev["Severity"] = klaim_sev["Severity"].apply(simplify_number)
+    # Grafik dibuat per kelompok dan hanya untuk kelompok yang dibuka, sehingga
+    # figure Plotly kelompok yang tertutup tidak dihitung maupun dikirim ke browser
+    opened_sections = st.segmented_control(
+        "Grafik yang ditampilkan", chart_sections, selection_mode="multi",
+        default=chart_sections[:1], key="chart_sections"
+    )
+
+    # Top N premi dan klaim
+    if "Top Insured" in opened_sections:
+        premi_sev = aggregates.premi_top.copy()
+        klaim_sev = aggregates.klaim_top.copy()
+        premi_sev["Severity"] = engine.simplify_numbers(premi_sev["Severity"])
+        klaim_sev["Severity"] = engine.simplify_numbers(klaim_sev["Severity"])
 
     # Frekuensi klaim
-    valid_claims = filtered_df_display[filtered_df_display["NO KLAIM"].notna()]
-    total_frequency = len(valid_claims)
-    valid_claims["Incurred"] = (
-        valid_claims["Paid Claim"].fillna(0) +
-        valid_claims["OS Claim"].fillna(0) -
-        valid_claims["Recovery Klaim Reas"].fillna(0)
-    )
-    incurred_average = valid_claims["Incurred"].mean()
-    incurred_average = f"{incurred_average:,.0f}".replace(",", ".")
+    total_frequency = aggregates.claim_frequency
+    incurred_average = f"{aggregates.incurred_average:,.0f}".replace(",", ".")
 
     # Layout kolom
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -20px;
-                    position: relative;
-                    top: 10px;
-                }
-            </style>
-            <h4 class="custom-title">10 Sumber Pendapatan Premi Terbesar</h4>
-        """, unsafe_allow_html=True)
+        if "Top Insured" in opened_sections:
+            st.markdown(f"""
+                <style>
+                    .custom-title {{
+                        text-align: center;
+                        margin-bottom: -20px;
+                        position: relative;
+                        top: 10px;
+                    }}
+                </style>
+                <h4 class="custom-title">{top_n} Sumber Pendapatan Premi Terbesar{"" if drill_down is None else f" ({drill_down[1]})"}</h4>
+            """, unsafe_allow_html=True)
 
-        colors = [
-            "#7a3300", "#a34700", "#cc5c00", "#e67300", "#ff8000",
-            "#ff9933", "#ffb366", "#ffcc99", "#ffe0cc", "#fff5e6"
-        ]
-        fig1 = px.bar(
-            premi_sev,
-            x="Severity",
-            y="Insuredname",
-            orientation="h",
-            text="Severity",
-            color="Insuredname",
-            color_discrete_sequence=colors
-        )
-        fig1.update_layout(
-            width=900,
-            height=500,
-            margin=dict(l=250, r=50, t=10, b=50),
-            font=dict(size=14),
-            xaxis_title=None,
-            yaxis_title=None,
-            showlegend=False
-        )
-        fig1.update_traces(textposition="auto")
-        st.plotly_chart(fig1)
+            colors = [
+                "#7a3300", "#a34700", "#cc5c00", "#e67300", "#ff8000",
+                "#ff9933", "#ffb366", "#ffcc99", "#ffe0cc", "#fff5e6"
+            ]
+            with engine.stage("figure", "Top Premi"):
+                fig1 = px.bar(
+                    premi_sev,
+                    x="Severity",
+                    y="Insuredname",
+                    orientation="h",
+                    text="Severity",
+                    color="Insuredname",
+                    color_discrete_sequence=colors
+                )
+                fig1.update_layout(
+                    width=900,
+                    height=500,
+                    margin=dict(l=250, r=50, t=10, b=50),
+                    font=dict(size=14),
+                    xaxis_title=None,
+                    yaxis_title=None,
+                    showlegend=False
+                )
+                fig1.update_traces(textposition="auto")
+                st.plotly_chart(fig1)
 
     with col2:
         st.markdown("<br>", unsafe_allow_html=True)
@@ -307,316 +765,320 @@ if file_premi and file_klaim and file_os:
         """, unsafe_allow_html=True)
 
     with col3:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -20px;
-                    position: relative;
-                    top: 10px;
-                }
-            </style>
-            <h4 class="custom-title">10 Penghasil Klaim Terbesar</h4>
-        """, unsafe_allow_html=True)
+        if "Top Insured" in opened_sections:
+            st.markdown(f"""
+                <style>
+                    .custom-title {{
+                        text-align: center;
+                        margin-bottom: -20px;
+                        position: relative;
+                        top: 10px;
+                    }}
+                </style>
+                <h4 class="custom-title">{top_n} Penghasil Klaim Terbesar{"" if drill_down is None else f" ({drill_down[1]})"}</h4>
+            """, unsafe_allow_html=True)
 
-        colors = [
-            "#7a3300", "#a34700", "#cc5c00", "#e67300", "#ff8000",
-            "#ff9933", "#ffb366", "#ffcc99", "#ffe0cc", "#fff5e6"
-        ]
-        fig2 = px.bar(
-            klaim_sev,
-            x="Severity",
-            y="Claimant",
-            orientation="h",
-            text="Severity",
-            color="Claimant",
-            color_discrete_sequence=colors
-        )
-        fig2.update_layout(
-            width=900,
-            height=500,
-            margin=dict(l=250, r=50, t=10, b=10),
-            font=dict(size=14),
-            xaxis_title="Klaim",
-            yaxis_title=None,
-            showlegend=False
-        )
-        fig2.update_traces(textposition="auto")
-        st.plotly_chart(fig2)
+            colors = [
+                "#7a3300", "#a34700", "#cc5c00", "#e67300", "#ff8000",
+                "#ff9933", "#ffb366", "#ffcc99", "#ffe0cc", "#fff5e6"
+            ]
+            with engine.stage("figure", "Top Klaim"):
+                fig2 = px.bar(
+                    klaim_sev,
+                    x="Severity",
+                    y="Claimant",
+                    orientation="h",
+                    text="Severity",
+                    color="Claimant",
+                    color_discrete_sequence=colors
+                )
+                fig2.update_layout(
+                    width=900,
+                    height=500,
+                    margin=dict(l=250, r=50, t=10, b=10),
+                    font=dict(size=14),
+                    xaxis_title="Klaim",
+                    yaxis_title=None,
+                    showlegend=False
+                )
+                fig2.update_traces(textposition="auto")
+                st.plotly_chart(fig2)
 
-    st.subheader("💸 Summary by Premi")
-    filtered_df_display["Premi Gross"] = pd.to_numeric(filtered_df_display["Premi Gross"], errors="coerce")
-    filtered_df_display["Paid Claim"] = pd.to_numeric(filtered_df_display["Paid Claim"], errors="coerce")
+    if "Summary by Premi" in opened_sections:
+        st.subheader("💸 Summary by Premi")
+        toc_premi = aggregates.premi_by["TOC"]
+        occupancy_premi = aggregates.premi_by["Kategori Okupasi"]
+        risklevel_premi = aggregates.premi_by["Kategori Risiko Okupasi"].copy()
 
-    toc_premi = filtered_df_display.groupby(by=["TOC"], as_index=False)["Premi Gross"].sum()
-    occupancy_premi = filtered_df_display.groupby(by=["Kategori Okupasi"], as_index=False)["Premi Gross"].sum()
-    risklevel_premi = filtered_df_display.groupby(by=["Kategori Risiko Okupasi"], as_index=False)["Premi Gross"].sum()
+        col1, col2, col3 = st.columns(3)
 
-    col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        left: -30px; /* Geser ke kiri */
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">TOC</h4>
+            """, unsafe_allow_html=True)
 
-    with col1:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    left: -30px; /* Geser ke kiri */
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">TOC</h4>
-        """, unsafe_allow_html=True)
+            with engine.stage("figure", "Premi - TOC"):
+                fig = px.pie(
+                    toc_premi,
+                    values="Premi Gross",
+                    names="TOC",
+                    hole=0.5,
+                    color_discrete_sequence=["#003087", "#4D8CFF", "#B3D1FF", "#E6F0FF"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
+                )
+                st.plotly_chart(fig)
 
-        fig = px.pie(
-            toc_premi,
-            values="Premi Gross",
-            names="TOC",
-            hole=0.5,
-            color_discrete_sequence=["#003087", "#4D8CFF", "#B3D1FF", "#E6F0FF"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
-        )
-        st.plotly_chart(fig)
+        with col2:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        left: -30px; /* Geser ke kiri */
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">Kategori Okupasi</h4>
+            """, unsafe_allow_html=True)
 
-    with col2:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    left: -30px; /* Geser ke kiri */
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">Kategori Okupasi</h4>
-        """, unsafe_allow_html=True)
+            with engine.stage("figure", "Premi - Kategori Okupasi"):
+                fig = px.pie(
+                    occupancy_premi,
+                    values="Premi Gross",
+                    names="Kategori Okupasi",
+                    hole=0.5,
+                    color_discrete_sequence=["#004d00", "#339933", "#66B266"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
+                )
+                st.plotly_chart(fig)
 
-        fig = px.pie(
-            occupancy_premi,
-            values="Premi Gross",
-            names="Kategori Okupasi",
-            hole=0.5,
-            color_discrete_sequence=["#004d00", "#339933", "#66B266"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
-        )
-        st.plotly_chart(fig)
+        with col3:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">Risk Level</h4>
+            """, unsafe_allow_html=True)
 
-    with col3:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">Risk Level</h4>
-        """, unsafe_allow_html=True)
+            risk_order = ['C', 'B', 'D', 'A']
+            risklevel_premi['Kategori Risiko Okupasi'] = pd.Categorical(
+                risklevel_premi['Kategori Risiko Okupasi'],
+                categories=risk_order,
+                ordered=True
+            )
+            risklevel_premi = risklevel_premi.sort_values('Kategori Risiko Okupasi')
 
-        risk_order = ['C', 'B', 'D', 'A']
-        risklevel_premi['Kategori Risiko Okupasi'] = pd.Categorical(
-            risklevel_premi['Kategori Risiko Okupasi'],
-            categories=risk_order,
-            ordered=True
-        )
-        risklevel_premi = risklevel_premi.sort_values('Kategori Risiko Okupasi')
-
-        fig = px.pie(
-            risklevel_premi,
-            values="Premi Gross",
-            names="Kategori Risiko Okupasi",
-            hole=0.5,
-            color_discrete_sequence=["#ff8000", "#a34700", "#cc5c00", "#7a3300"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle", traceorder='normal')
-        )
-        st.plotly_chart(fig)
+            with engine.stage("figure", "Premi - Risk Level"):
+                fig = px.pie(
+                    risklevel_premi,
+                    values="Premi Gross",
+                    names="Kategori Risiko Okupasi",
+                    hole=0.5,
+                    color_discrete_sequence=["#ff8000", "#a34700", "#cc5c00", "#7a3300"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle", traceorder='normal')
+                )
+                st.plotly_chart(fig)
 
-    st.subheader("💣 Summary by Klaim")
-    toc_klaim = filtered_df_display.groupby(by=["TOC"], as_index=False)["Paid Claim"].sum()
-    occupancy_klaim = filtered_df_display.groupby(by=["Kategori Okupasi"], as_index=False)["Paid Claim"].sum()
-    risklevel_klaim = filtered_df_display.groupby(by=["Kategori Risiko Okupasi"], as_index=False)["Paid Claim"].sum()
+    if "Summary by Klaim" in opened_sections:
+        st.subheader("💣 Summary by Klaim")
+        toc_klaim = aggregates.klaim_by["TOC"]
+        occupancy_klaim = aggregates.klaim_by["Kategori Okupasi"]
+        risklevel_klaim = aggregates.klaim_by["Kategori Risiko Okupasi"].copy()
 
-    col1, col2, col3 = st.columns(3)
+        col1, col2, col3 = st.columns(3)
 
-    with col1:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">TOC</h4>
-        """, unsafe_allow_html=True)
+        with col1:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">TOC</h4>
+            """, unsafe_allow_html=True)
 
-        fig = px.pie(
-            toc_klaim,
-            values="Paid Claim",
-            names="TOC",
-            hole=0.5,
-            color_discrete_sequence=["#003087", "#4D8CFF", "#B3D1FF", "#E6F0FF"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
-        )
-        st.plotly_chart(fig)
+            with engine.stage("figure", "Klaim - TOC"):
+                fig = px.pie(
+                    toc_klaim,
+                    values="Paid Claim",
+                    names="TOC",
+                    hole=0.5,
+                    color_discrete_sequence=["#003087", "#4D8CFF", "#B3D1FF", "#E6F0FF"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
+                )
+                st.plotly_chart(fig)
 
-    with col2:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">Kategori Okupasi</h4>
-        """, unsafe_allow_html=True)
+        with col2:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">Kategori Okupasi</h4>
+            """, unsafe_allow_html=True)
 
-        fig = px.pie(
-            occupancy_klaim,
-            values="Paid Claim",
-            names="Kategori Okupasi",
-            hole=0.5,
-            color_discrete_sequence=["#004d00", "#339933", "#66B266"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
-        )
-        st.plotly_chart(fig)
+            with engine.stage("figure", "Klaim - Kategori Okupasi"):
+                fig = px.pie(
+                    occupancy_klaim,
+                    values="Paid Claim",
+                    names="Kategori Okupasi",
+                    hole=0.5,
+                    color_discrete_sequence=["#004d00", "#339933", "#66B266"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle")
+                )
+                st.plotly_chart(fig)
 
-    with col3:
-        st.markdown("""
-            <style>
-                .custom-title {
-                    text-align: center;
-                    margin-bottom: -10px;
-                    position: relative;
-                    top: 0px;
-                }
-            </style>
-            <h4 class="custom-title">Risk Level</h4>
-        """, unsafe_allow_html=True)
+        with col3:
+            st.markdown("""
+                <style>
+                    .custom-title {
+                        text-align: center;
+                        margin-bottom: -10px;
+                        position: relative;
+                        top: 0px;
+                    }
+                </style>
+                <h4 class="custom-title">Risk Level</h4>
+            """, unsafe_allow_html=True)
 
-        risk_order = ['A', 'B', 'C', 'D']
-        risklevel_klaim['Kategori Risiko Okupasi'] = pd.Categorical(
-            risklevel_klaim['Kategori Risiko Okupasi'],
-            categories=risk_order,
-            ordered=True
-        )
-        risklevel_klaim = risklevel_klaim.sort_values('Kategori Risiko Okupasi')
-
-        fig = px.pie(
-            risklevel_klaim,
-            values="Paid Claim",
-            names="Kategori Risiko Okupasi",
-            hole=0.5,
-            color_discrete_sequence=["#ff8000", "#a34700", "#cc5c00", "#7a3300"]
-        )
-        fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
-        fig.update_layout(
-            width=400,
-            height=250,
-            margin=dict(l=10, r=10, t=10, b=10),
-            font=dict(size=12),
-            legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle", traceorder='normal')
-        )
-        st.plotly_chart(fig)
+            risk_order = ['A', 'B', 'C', 'D']
+            risklevel_klaim['Kategori Risiko Okupasi'] = pd.Categorical(
+                risklevel_klaim['Kategori Risiko Okupasi'],
+                categories=risk_order,
+                ordered=True
+            )
+            risklevel_klaim = risklevel_klaim.sort_values('Kategori Risiko Okupasi')
+
+            with engine.stage("figure", "Klaim - Risk Level"):
+                fig = px.pie(
+                    risklevel_klaim,
+                    values="Paid Claim",
+                    names="Kategori Risiko Okupasi",
+                    hole=0.5,
+                    color_discrete_sequence=["#ff8000", "#a34700", "#cc5c00", "#7a3300"]
+                )
+                fig.update_traces(textinfo='percent', textposition='inside', textfont=dict(color='white'))
+                fig.update_layout(
+                    width=400,
+                    height=250,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    font=dict(size=12),
+                    legend=dict(x=1, y=0.5, xanchor="left", yanchor="middle", traceorder='normal')
+                )
+                st.plotly_chart(fig)
 
-    # Hitung loss ratio
-    lossratio = (
-        ((filtered_df_display["Paid Claim"].sum() + filtered_df_display["OS Claim"].sum()) - 
-         (filtered_df_display["Recovery Klaim Reas"].sum() + filtered_df_display["Recovery OS Claim Reas"].sum()))
-    ) / (filtered_df_display["Premi Gross"].sum() - filtered_df_display["Akuisisi"].sum() - 
-         filtered_df_display["Premi Reas"].sum() + filtered_df_display["Komisi Reas"].sum())
+    # Hitung loss ratio basis written dan basis earned (pada tanggal valuasi)
+    lossratio = aggregates.loss_ratio
+    earned_lossratio = filtered_view(dataset['key'], 'earned_loss_ratio', filters, (valuation_date,), backend)
 
     # Histogram dan Loss Ratio
     col1, col2 = st.columns(2)
 
     with col1:
-        st.write("### 📊 Histogram Berdasarkan Underwriting Year (UY)")
-        summary_df_melted = summary_df.melt(id_vars=['UY'], value_vars=summary_columns,
-                                            var_name='Metric', value_name='Value')
-        summary_df_melted = summary_df_melted[summary_df_melted['UY'] != 'Grand Total']
-        summary_df_melted['Value'] = pd.to_numeric(summary_df_melted['Value'].str.replace(',', ''), errors='coerce')
-
-        fig = px.histogram(
-            summary_df_melted,
-            x='UY',
-            y='Value',
-            color='Metric',
-            barmode='group',
-            color_discrete_map={
-                'Premi Gross': '#003087',
-                'Akuisisi': '#66B2B2',
-                'Premi Reas': '#FF4D94',
-                'Komisi Reas': '#FF8000',
-                'Paid Claim': '#FFB366',
-                'Recovery Klaim Reas': '#339933',
-                'OS Claim': '#4D0099',
-                'Recovery OS Claim Reas': '#99CCFF'
-            }
-        )
-        fig.update_layout(
-            legend=dict(
-                orientation="v",
-                yanchor="middle",
-                y=0.5,
-                xanchor="left",
-                x=1.0
+        if "Histogram UY" in opened_sections:
+            st.write("### 📊 Histogram Berdasarkan Underwriting Year (UY)")
+            summary_df_melted = summary_df[summary_df['UY'] != 'Grand Total'].melt(
+                id_vars=['UY'], value_vars=engine.additional_columns, var_name='Metric', value_name='Value'
             )
-        )
 
-        max_value = summary_df_melted['Value'].max()
-        tickvals = list(range(0, int(max_value) + 100000000000, 100000000000))
-        ticktext = [f"{val:,.0f}".replace(",", ".") for val in tickvals]
-
-        fig.update_layout(
-            height=600,
-            width=800,
-            yaxis_title=None,
-            xaxis_title="Underwriting Year (UY)",
-            margin=dict(l=10, r=10, t=10, b=10),
-            bargap=0.2,
-            yaxis=dict(tickmode='array', tickvals=tickvals, ticktext=ticktext)
-        )
-        st.plotly_chart(fig)
+            with engine.stage("figure", "Histogram UY"):
+                fig = px.histogram(
+                    summary_df_melted,
+                    x='UY',
+                    y='Value',
+                    color='Metric',
+                    barmode='group',
+                    color_discrete_map={
+                        'Premi Gross': '#003087',
+                        'Akuisisi': '#66B2B2',
+                        'Premi Reas': '#FF4D94',
+                        'Komisi Reas': '#FF8000',
+                        'Paid Claim': '#FFB366',
+                        'Recovery Klaim Reas': '#339933',
+                        'OS Claim': '#4D0099',
+                        'Recovery OS Claim Reas': '#99CCFF'
+                    }
+                )
+                fig.update_layout(
+                    legend=dict(
+                        orientation="v",
+                        yanchor="middle",
+                        y=0.5,
+                        xanchor="left",
+                        x=1.0
+                    )
+                )
+
+                tickvals = nice_ticks(summary_df_melted['Value'])
+                ticktext = [f"{val:,.0f}".replace(",", ".") for val in tickvals]
+
+                fig.update_layout(
+                    height=600,
+                    width=800,
+                    yaxis_title=None,
+                    xaxis_title="Underwriting Year (UY)",
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    bargap=0.2,
+                    yaxis=dict(tickmode='array', tickvals=tickvals, ticktext=ticktext)
+                )
+                st.plotly_chart(fig)
 
     with col2:
         st.markdown("<br>", unsafe_allow_html=True)
@@ -657,5 +1119,230 @@ if file_premi and file_klaim and file_os:
                         <h1>{lossratio*100:.2f}%</h1>
                     </div>
                 </div>
+                <div class="section-box">
+                    <h2>Loss Ratio (Earned)</h2>
+                    <div class="value-box">
+                        <h1>{earned_lossratio*100:.2f}%</h1>
+                    </div>
+                </div>
             </div>
         """, unsafe_allow_html=True)
+        st.caption(f"Basis earned: premi diakui pro-rata harian sampai {valuation_date:%d-%m-%Y}.")
+
+    # Triangle loss ratio UY x AY dan tren bulanan dari cell triangle inkremental
+    if "Triangle LR" in opened_sections:
+        st.subheader("🔺 Triangle Loss Ratio")
+        triangle_cells = filtered_view(dataset['key'], 'triangle_cells', filters, (), backend)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write("#### Loss Ratio Kumulatif UY x AY")
+            triangle_df = engine.development_triangle(triangle_cells)
+            render_dataframe("Triangle UY x AY", triangle_df, hide_index=True, column_config={
+                col: st.column_config.NumberColumn(format="percent") for col in triangle_df.columns if col != 'UY'
+            })
+
+        with col2:
+            st.write(f"#### Tren Loss Ratio per Bulan ({date_filter.title()})")
+            trend = engine.monthly_trend(triangle_cells, date_filter)
+            with engine.stage("figure", "Tren Loss Ratio"):
+                fig = px.line(
+                    trend,
+                    x='Bulan',
+                    y=['Loss Ratio', 'Loss Ratio Kumulatif'],
+                    color_discrete_sequence=["#FFB366", "#003087"]
+                )
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    xaxis_title=None,
+                    yaxis_title=None,
+                    yaxis_tickformat='.0%',
+                    legend=dict(title=None, orientation="h", y=1.1)
+                )
+                st.plotly_chart(fig)
+
+    # Earned premium per periode akuntansi dan loss ratio basis earned vs written per tahun
+    if "Earned Premium" in opened_sections:
+        st.subheader("📅 Earned Premium")
+        periode = st.radio("Periode", ["Bulan", "Kuartal", "Tahun"], horizontal=True, key="earned_period")
+        earned = filtered_view(dataset['key'], 'earned_premium_by_period', filters,
+                               ({"Bulan": 'M', "Kuartal": 'Q', "Tahun": 'Y'}[periode], valuation_date), backend)
+        earned['Net Premi Earned'] = engine.net_premium(earned)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write(f"#### Earned Premium per {periode}")
+            with engine.stage("figure", "Earned Premium"):
+                fig = px.bar(
+                    earned,
+                    x='Periode',
+                    y=['Premi Gross', 'Net Premi Earned'],
+                    barmode='group',
+                    color_discrete_sequence=["#FFB366", "#003087"]
+                )
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=10, r=10, t=10, b=10),
+                    xaxis_title=None,
+                    yaxis_title=None,
+                    legend=dict(title=None, orientation="h", y=1.1)
+                )
+                st.plotly_chart(fig)
+
+        with col2:
+            st.write("#### Loss Ratio Written vs Earned per Tahun")
+            earned_by_year = filtered_view(dataset['key'], 'earned_loss_ratio_by_year', filters, (valuation_date,),
+                                           backend)
+            render_dataframe("Loss Ratio Earned per Tahun", earned_by_year, hide_index=True, column_config={
+                **{col: st.column_config.NumberColumn(format="accounting")
+                   for col in ['Net Premi Written', 'Net Premi Earned', 'Net Klaim Incurred']},
+                'Loss Ratio Written': st.column_config.NumberColumn(format="percent"),
+                'Loss Ratio Earned': st.column_config.NumberColumn(format="percent"),
+            })
+            st.caption("Klaim per AY dibandingkan dengan premi yang earned pada tahun kalender yang sama.")
+
+    # Distribusi severity per klaim/polis/insured. Histogram dan densitas dihitung di
+    # server dan digambar dengan trace WebGL (Scattergl), sehingga ukuran data yang
+    # dikirim ke browser tetap terbatas berapa pun jumlah barisnya.
+    if "Distribusi Severity" in opened_sections:
+        st.subheader("📈 Distribusi Severity")
+        col1, col2 = st.columns(2)
+
+        with col1:
+            basis = st.radio("Basis", engine.severity_bases, horizontal=True, key="severity_basis")
+            histogram, quantiles, non_positive = severity_view(dataset['key'], filters, basis, backend)
+            with engine.stage("figure", "Distribusi Severity"):
+                fig = go.Figure(go.Scattergl(
+                    x=np.r_[histogram['Batas Bawah'], histogram['Batas Atas'].iloc[-1:]] if len(histogram) else [],
+                    y=np.r_[histogram['Jumlah'], histogram['Jumlah'].iloc[-1:]] if len(histogram) else [],
+                    mode='lines',
+                    line=dict(shape='hv', color="#003087"),
+                    fill='tozeroy',
+                    showlegend=False,
+                ))
+                # Garis kuantil sebagai trace (skala log), label di legend
+                for (label, value), color in zip(quantiles.items(), ["#FFB366", "#f08522", "#b35900"]):
+                    if value > 0:
+                        fig.add_trace(go.Scattergl(
+                            x=[value, value],
+                            y=[0, histogram['Jumlah'].max()],
+                            mode='lines',
+                            line=dict(dash='dash', color=color),
+                            name=f"{label}: {engine.simplify_numbers([value])[0]}",
+                        ))
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=10, r=10, t=30, b=10),
+                    xaxis_type='log',
+                    xaxis_title=basis,
+                    yaxis_title="Jumlah",
+                    legend=dict(title=None, orientation="h", y=1.1)
+                )
+                st.plotly_chart(fig)
+            if non_positive:
+                st.caption(f"{non_positive:,} nilai ≤ 0 tidak ditampilkan pada skala log.")
+
+        with col2:
+            st.write("#### Premi vs Incurred per Insured")
+            density = filtered_view(dataset['key'], 'insured_density', filters, (), backend)
+            with engine.stage("figure", "Densitas Insured"):
+                fig = go.Figure(go.Scattergl(
+                    x=density['Premi'],
+                    y=density['Incurred'],
+                    mode='markers',
+                    marker=dict(
+                        color=np.log10(density['Jumlah Insured'].astype('float64')),
+                        colorscale=[[0, "#FFB366"], [1, "#003087"]],
+                        size=8,
+                        colorbar=dict(title="Insured", tickprefix="10^"),
+                    ),
+                    customdata=density['Jumlah Insured'],
+                    hovertemplate="Premi %{x:,.0f}<br>Incurred %{y:,.0f}<br>%{customdata:,} insured<extra></extra>",
+                ))
+                fig.update_layout(
+                    height=400,
+                    margin=dict(l=10, r=10, t=30, b=10),
+                    xaxis_type='log',
+                    yaxis_type='log',
+                    xaxis_title="Premi Gross",
+                    yaxis_title="Incurred"
+                )
+                st.plotly_chart(fig)
+            st.caption("Insured dikelompokkan ke grid log 50 x 50; hanya insured dengan premi dan incurred positif.")
+
+# Proses data jika dataset bersama dipilih atau semua file diunggah
+dataset = None
+if shared_dataset is not None:
+    dataset = load_shared_dataset(shared_dataset['path'], policy_join)
+    st.session_state['dataset'] = dataset
+    st.info(f"📚 Memakai dataset bersama **{shared_dataset['name']}** (v{shared_dataset['version']}) "
+            f"dengan **{dataset['backend'].n_rows:,} baris**.")
+elif df_premi is not None and df_klaim is not None and df_os_klaim is not None:
+    source_paths = {
+        'Premi': source_parquet('Premi', source_key_premi, snapshot_premi),
+        'Klaim': source_parquet('Klaim', source_key_klaim, snapshot_klaim),
+        'OS Klaim': source_parquet('OS Klaim', source_key_os, snapshot_os),
+    }
+    dataset = load_dataset((source_key_premi, source_key_klaim, source_key_os),
+                           df_premi, df_klaim, df_os_klaim, policy_join, source_paths)
+    publish_shared_dataset({'Premi': df_premi, 'Klaim': df_klaim, 'OS Klaim': df_os_klaim})
+if dataset is not None:
+    warmed_datasets = st.session_state.setdefault('warmed_datasets', set())
+    if warm_up and dataset['key'] not in warmed_datasets:
+        warm_up_views(dataset)
+        warmed_datasets.add(dataset['key'])
+    if dataset['match_rates'] is not None:
+        st.info(
+            f"🔗 Data digabung per polis menjadi **{dataset['backend'].n_rows:,} baris**. "
+            f"Match rate Klaim: **{dataset['match_rates']['Klaim']:.1%}**, "
+            f"OS Klaim: **{dataset['match_rates']['OS Klaim']:.1%}**."
+        )
+    if dataset.get('join_error'):
+        st.warning(f"⚠️ {dataset['join_error']}. Data tetap ditumpuk tanpa join per polis.")
+    render_analytics()
+
+# Panel performa per session: waktu, jumlah baris dan memori per tahap. Dijalankan
+# sebagai fragment agar tombol Perbarui bisa menampilkan catatan rerun fragment analitik.
+@st.fragment
+def render_perf_panel():
+    st.header("⏱️ Performa")
+    st.button("🔄 Perbarui", key="perf_refresh")
+    records = perf_log.to_frame()
+    if records.empty:
+        st.caption("Belum ada tahap yang tercatat.")
+        return
+    records['memory'] = records['memory'] / 2**20
+    perf_column_config = {
+        'seconds': st.column_config.NumberColumn("detik", format="%.3f"),
+        'memory': st.column_config.NumberColumn("memori puncak (MB)", format="%.0f"),
+    }
+
+    last_run = records[records['run'] == records['run'].max()]
+    st.write(f"**Run terakhir** (#{last_run['run'].iloc[0]}, {last_run['scope'].iloc[0]})")
+    st.dataframe(last_run[['stage', 'detail', 'seconds', 'rows_in', 'rows_out', 'memory']],
+                 hide_index=True, column_config=perf_column_config)
+
+    st.write(f"**Ringkasan session** ({records['run'].nunique():,} run)")
+    summary = records.groupby(['stage', 'detail'], dropna=False).agg(
+        jumlah=('seconds', 'size'),
+        seconds=('seconds', 'mean'),
+        maks=('seconds', 'max'),
+        memory=('memory', 'max'),
+    ).reset_index()
+    st.dataframe(summary, hide_index=True, column_config={
+        **perf_column_config,
+        'seconds': st.column_config.NumberColumn("rata-rata detik", format="%.3f"),
+        'maks': st.column_config.NumberColumn("maks detik", format="%.3f"),
+    })
+    st.download_button(
+        "⬇️ Unduh log performa (JSON Lines)",
+        records.to_json(orient='records', lines=True, date_format='iso'),
+        file_name=f"perf_{perf_log.context['session']}.jsonl",
+        mime="application/json",
+    )
+
+perf_log.end_run()
+if st.sidebar.checkbox("⏱️ Tampilkan panel performa", key="perf_panel"):
+    with st.sidebar:
+        render_perf_panel()
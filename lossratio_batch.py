@@ -0,0 +1,137 @@
+# Batch CLI untuk laporan Loss Ratio by Kategori Okupasi tanpa Streamlit.
+# Contoh:
+#   python lossratio_batch.py --premi premi.xlsx --klaim klaim.xlsx --os os.xlsx \
+#       --toc FIRE --format html --output-dir laporan
+#   python lossratio_batch.py --premi premi.xlsx --klaim klaim.xlsx --os os.xlsx \
+#       --all-combinations --workers 4
+import argparse
+import itertools
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import lossratio_engine as engine
+import lossratio_statistics as statistics
+
+# Data gabungan, cube dan index filter per worker (diisi oleh init_worker)
+worker_state = {}
+
+def init_worker(df, cube):
+    worker_state['df'] = df
+    worker_state['cube'] = cube
+    worker_state['filter_index'] = engine.FilterIndex(df)
+
+def load_dataset(args):
+    df_premi = engine.read_source(args.premi, "Premi", engine.key_columns_premi, streaming=args.streaming)
+    df_klaim = engine.read_source(args.klaim, "Klaim", engine.key_columns_klaim, streaming=args.streaming)
+    df_os_klaim = engine.read_source(args.os, "OS Klaim", engine.key_columns_osklaim, streaming=args.streaming)
+    df = engine.combine_sources(df_premi, df_klaim, df_os_klaim)
+    if args.policy_join:
+        try:
+            df, match_rates = engine.build_policy_fact(df)
+        except ValueError as error:
+            raise SystemExit(str(error))
+        print(f"Data digabung per polis: {len(df):,} baris. Match rate Klaim: {match_rates['Klaim']:.1%}, "
+              f"OS Klaim: {match_rates['OS Klaim']:.1%}")
+    return df
+
+# Nama folder output untuk satu kombinasi filter
+def combination_name(filters):
+    parts = [f"{col}={'+'.join(map(str, values))}" for col, values in filters.items() if values]
+    name = "__".join(parts) or "semua"
+    return re.sub(r'[^\w=+.-]+', '_', name)
+
+def write_table(table, path, output_format):
+    if output_format == 'csv':
+        table.to_csv(path + '.csv', index=False)
+    elif output_format == 'parquet':
+        engine.to_arrow_safe(table).to_parquet(path + '.parquet', index=False)
+    else:
+        table.to_html(path + '.html', index=False, float_format=lambda x: f"{x:,.2f}")
+
+# Hitung dan tulis laporan untuk satu kombinasi filter
+def run_report(filters, date_filter, date_range, valuation_date, output_dir, output_format):
+    df = worker_state['df']
+    filtered_df, agg_df = engine.select_rows(
+        df, worker_state['cube'], worker_state['filter_index'],
+        filters['TOC'], filters['Kategori Okupasi'], filters['Kategori Risiko Okupasi'],
+        date_filter, date_range,
+    )
+    aggregates = engine.compute_aggregates(agg_df, filtered_df)
+    earned_loss_ratio = engine.earned_loss_ratio(filtered_df, valuation_date)
+    report_dir = os.path.join(output_dir, combination_name(filters))
+    os.makedirs(report_dir, exist_ok=True)
+    write_table(engine.uy_summary_table(aggregates.summary_uy), os.path.join(report_dir, 'uy_summary'), output_format)
+    write_table(engine.breakdown_table(aggregates), os.path.join(report_dir, 'breakdown'), output_format)
+    write_table(engine.loss_ratio_table(aggregates, earned_loss_ratio), os.path.join(report_dir, 'loss_ratio'),
+                output_format)
+    write_table(engine.earned_loss_ratio_by_year(filtered_df, valuation_date),
+                os.path.join(report_dir, 'loss_ratio_earned'), output_format)
+    write_table(statistics.claim_statistics(filtered_df), os.path.join(report_dir, 'claim_statistics'), output_format)
+    return report_dir, len(filtered_df), aggregates.loss_ratio, earned_loss_ratio
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Laporan Loss Ratio by Kategori Okupasi (batch)")
+    parser.add_argument('--premi', required=True, help="File Excel data premi")
+    parser.add_argument('--klaim', required=True, help="File Excel data klaim")
+    parser.add_argument('--os', required=True, help="File Excel data OS klaim")
+    parser.add_argument('--toc', nargs='*', default=[], help="Filter TOC")
+    parser.add_argument('--kategori-okupasi', nargs='*', default=[], help="Filter Kategori Okupasi")
+    parser.add_argument('--risiko-okupasi', nargs='*', default=[], help="Filter Kategori Risiko Okupasi")
+    parser.add_argument('--date-filter', choices=['INCEPTION DATE', 'EXPIRY DATE'], default='INCEPTION DATE',
+                        help="Kolom tanggal untuk filter --start/--end")
+    parser.add_argument('--start', help="Tanggal awal (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Tanggal akhir (YYYY-MM-DD)")
+    parser.add_argument('--valuation-date', default=pd.Timestamp.today().strftime('%Y-%m-%d'),
+                        help="Tanggal valuasi earned premium (YYYY-MM-DD), default hari ini")
+    parser.add_argument('--all-combinations', action='store_true',
+                        help="Buat laporan untuk setiap kombinasi TOC x Kategori Okupasi")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'html'], default='csv')
+    parser.add_argument('--output-dir', default='laporan')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--streaming', action='store_true', help="Baca Excel secara streaming")
+    parser.add_argument('--policy-join', action='store_true', help="Gabungkan data per polis")
+    parser.add_argument('--perf-log', action='store_true',
+                        help="Tulis log performa per tahap (JSON per baris) ke stderr")
+    args = parser.parse_args(argv)
+    if bool(args.start) != bool(args.end):
+        parser.error("--start dan --end harus diisi bersamaan")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.perf_log:
+        logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+        engine.logger.setLevel(logging.INFO)
+    df = load_dataset(args)
+    cube = engine.build_cube(df)
+    date_range = (pd.Timestamp(args.start).date(), pd.Timestamp(args.end).date()) if args.start else ()
+    valuation_date = pd.Timestamp(args.valuation_date)
+
+    if args.all_combinations:
+        toc_values = args.toc or sorted(df['TOC'].dropna().unique())
+        okupasi_values = args.kategori_okupasi or sorted(df['Kategori Okupasi'].dropna().unique())
+        combinations = [
+            {'TOC': [toc], 'Kategori Okupasi': [okupasi], 'Kategori Risiko Okupasi': args.risiko_okupasi}
+            for toc, okupasi in itertools.product(toc_values, okupasi_values)
+        ]
+    else:
+        combinations = [{'TOC': args.toc, 'Kategori Okupasi': args.kategori_okupasi,
+                         'Kategori Risiko Okupasi': args.risiko_okupasi}]
+
+    workers = max(1, min(args.workers or 1, len(combinations)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(df, cube)) as executor:
+        futures = [
+            executor.submit(run_report, filters, args.date_filter, date_range, valuation_date, args.output_dir,
+                            args.format)
+            for filters in combinations
+        ]
+        for future in as_completed(futures):
+            report_dir, n_rows, loss_ratio, earned_loss_ratio = future.result()
+            print(f"{report_dir}: {n_rows:,} baris, Loss Ratio {loss_ratio:.2%} (earned {earned_loss_ratio:.2%})")
+
+if __name__ == "__main__":
+    main()
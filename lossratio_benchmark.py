@@ -0,0 +1,149 @@
+# Benchmark engine Loss Ratio pada data sintetis berbagai ukuran. Setiap tahap
+# (ingestion, deduplikasi, normalisasi, cube, filter, agregasi dan earned premium) diukur lewat
+# instrumentasi engine.stage; hasilnya berupa waktu, throughput (baris/detik) dan
+# memori per tahap, bisa disimpan ke CSV dan dibandingkan dengan versi lain.
+# Contoh:
+#   python lossratio_benchmark.py --rows 10000 100000 1000000 --output bench_baru.csv
+#   python lossratio_benchmark.py --rows 10000 100000 --source xlsx --compare bench_lama.csv
+#   python lossratio_benchmark.py --rows 1000000 10000000 --backend duckdb
+import argparse
+import os
+import subprocess
+import tempfile
+
+import pandas as pd
+
+import lossratio_engine as engine
+import lossratio_statistics as statistics
+import lossratio_synthetic as synthetic
+
+# Skenario filter yang diukur: tanpa filter, filter kategori, rentang tanggal sejajar
+# bulan (dilayani cube) dan rentang tanggal tidak sejajar bulan (data baris)
+filter_scenarios = {
+    'tanpa filter': dict(selected_toc=[], selected_kategori_okupasi=[], selected_risiko_okupasi=[],
+                         date_range=()),
+    'TOC + Kategori Okupasi': dict(selected_toc=['FIRE'], selected_kategori_okupasi=['Komersial'],
+                                   selected_risiko_okupasi=[], date_range=()),
+    'tanggal sejajar bulan': dict(selected_toc=[], selected_kategori_okupasi=[], selected_risiko_okupasi=[],
+                                  date_range=(pd.Timestamp('2020-01-01').date(), pd.Timestamp('2021-12-31').date())),
+    'tanggal tidak sejajar': dict(selected_toc=[], selected_kategori_okupasi=[], selected_risiko_okupasi=[],
+                                  date_range=(pd.Timestamp('2020-01-15').date(), pd.Timestamp('2021-12-10').date())),
+}
+
+def code_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# Batas baris backend DuckDB per pilihan --backend (auto mengikuti engine)
+backend_min_rows = {'auto': engine.DUCKDB_MIN_ROWS, 'pandas': float('inf'), 'duckdb': 0}
+
+# Jalankan seluruh pipeline engine untuk satu dataset; tahap dicatat oleh perf_log
+def run_pipeline(paths, source_format, perf_log, n_rows, backend_name='auto'):
+    perf_log.context['rows'] = n_rows
+    perf_log.start_run("benchmark")
+    sources = {}
+    for sumber_data, key_columns in [('Premi', engine.key_columns_premi), ('Klaim', engine.key_columns_klaim),
+                                     ('OS Klaim', engine.key_columns_osklaim)]:
+        if source_format == 'xlsx':
+            sources[sumber_data] = engine.read_source(paths[sumber_data], sumber_data, key_columns)
+        else:
+            with engine.stage('parse_parquet', sumber_data) as record:
+                parsed_df = pd.read_parquet(paths[sumber_data])
+                record['rows_out'] = len(parsed_df)
+            sources[sumber_data] = engine.read_source(None, sumber_data, key_columns, parsed_df=parsed_df)
+    # Backend dipilih dari jumlah baris sumber seperti dashboard; pada DuckDB data gabungan,
+    # cube, index filter dan fact table join per polis pandas tidak dibangun
+    df = None
+    if engine.use_duckdb(sum(len(source) for source in sources.values()), backend_min_rows[backend_name]):
+        backend = engine.DuckDBBackend(sources)
+    else:
+        df = engine.combine_sources(sources['Premi'], sources['Klaim'], sources['OS Klaim'])
+        backend = engine.PandasBackend(df, engine.build_cube(df), engine.FilterIndex(df))
+    perf_log.context['backend'] = backend.name
+    for scenario, filters in filter_scenarios.items():
+        perf_log.context['scenario'] = scenario
+        filters = dict(filters, date_filter='INCEPTION DATE')
+        backend.aggregate(filters)
+        statistics.backend_claim_statistics(backend, filters)
+        backend.earned_premium_by_period(filters, 'M')
+    perf_log.context['scenario'] = None
+    if df is not None:
+        engine.build_policy_fact(df)
+    perf_log.end_run()
+
+# Ringkasan per ukuran x tahap: total detik, throughput (baris masuk, atau baris
+# keluar untuk tahap parse) dan memori maksimum
+def summarize(records):
+    records = records.copy()
+    records['scenario'] = records['scenario'].fillna('')
+    records['detail'] = records['detail'].fillna('')
+    summary = records.groupby(['version', 'backend', 'rows', 'stage', 'detail', 'scenario'], sort=False).agg(
+        seconds=('seconds', 'sum'),
+        rows_in=('rows_in', 'max'),
+        rows_out=('rows_out', 'max'),
+        memory_mb=('memory', 'max'),
+    ).reset_index()
+    summary['memory_mb'] = summary['memory_mb'] / 2**20
+    summary['rows_per_second'] = summary['rows_in'].fillna(summary['rows_out']) / summary['seconds']
+    return summary
+
+# Bandingkan dengan hasil benchmark sebelumnya: rasio > 1 berarti versi ini lebih cepat
+def compare(summary, previous):
+    keys = ['rows', 'stage', 'detail', 'scenario']
+    previous = previous.fillna({'detail': '', 'scenario': ''})
+    merged = summary.merge(previous[keys + ['version', 'seconds']], on=keys, suffixes=('', '_sebelumnya'))
+    merged['speedup'] = merged['seconds_sebelumnya'] / merged['seconds']
+    return merged[keys + ['version_sebelumnya', 'seconds_sebelumnya', 'seconds', 'speedup']]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark engine Loss Ratio pada data sintetis")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="Jumlah polis per dataset (10000 sampai 10000000)")
+    parser.add_argument('--source', choices=['parquet', 'xlsx'], default='parquet',
+                        help="Format input; xlsx mengukur parse Excel tetapi dibatasi ukuran sheet Excel")
+    parser.add_argument('--data-dir', help="Folder data sintetis; default folder sementara yang dihapus setelah selesai")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=['auto', 'pandas', 'duckdb'], default='auto',
+                        help="Backend agregasi; auto memilih DuckDB untuk dataset besar")
+    parser.add_argument('--label', default=None, help="Label versi; default commit git saat ini")
+    parser.add_argument('--output', help="Simpan ringkasan ke CSV")
+    parser.add_argument('--compare', help="CSV hasil benchmark sebelumnya untuk dibandingkan")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    version = args.label or code_version()
+    perf_log = engine.PerfLog(max_records=None, version=version)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for n_rows in args.rows:
+            paths = synthetic.dataset_paths(data_dir, n_rows, args.source)
+            if not all(os.path.exists(path) for path in paths.values()):
+                dataset = synthetic.generate_dataset(n_rows, args.seed)
+                try:
+                    synthetic.write_dataset(dataset, paths, args.source)
+                except ValueError as error:
+                    print(f"Lewati {n_rows:,} baris: {error}")
+                    continue
+                del dataset
+            print(f"Benchmark {n_rows:,} polis ({args.source})...")
+            run_pipeline(paths, args.source, perf_log, n_rows, args.backend)
+
+    if not perf_log.records:
+        return
+    summary = summarize(perf_log.to_frame())
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:,.3f}'.format):
+        print(summary.drop(columns='version').to_string(index=False))
+        if args.compare:
+            print()
+            print(compare(summary, pd.read_csv(args.compare)).to_string(index=False))
+    if args.output:
+        summary.to_csv(args.output, index=False)
+
+if __name__ == "__main__":
+    main()
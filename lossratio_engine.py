@@ -0,0 +1,1656 @@
+# Engine perhitungan Loss Ratio by Kategori Okupasi: ingestion, normalisasi,
+# filter dan agregasi. Tidak bergantung pada Streamlit sehingga bisa dipakai oleh
+# dashboard (dashboardlossratiookupasi.py) maupun batch CLI (lossratio_batch.py).
+import contextlib
+import contextvars
+import glob
+import hashlib
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import psutil
+
+# DuckDB opsional: tanpa DuckDB semua agregasi memakai backend pandas
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# fcntl hanya ada di POSIX; tanpa fcntl lock data inkremental hanya berlaku dalam satu proses
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# resource hanya ada di POSIX; tanpa resource puncak memori tahap hanya dari sampler RSS
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Fungsi untuk baca dan bersihkan file Excel
+def read_excel(file):
+    return drop_unnamed(pd.read_excel(file))
+
+def drop_unnamed(df):
+    return df.drop(columns=[col for col in df.columns if str(col).startswith("Unnamed")])
+
+# Kolom kunci deduplikasi per sumber data
+key_columns_premi = ['NO POLIS', 'NO SERTIFIKAT', 'INSURED NAME']
+key_columns_klaim = ['NO KLAIM', 'CLAIM AMOUNT (IDR)']
+key_columns_osklaim = ['INSURED NAME']
+
+# Daftar kolom
+desired_columns = [
+    'AY', 'UY', 'TOC_MOD', 'Kategori Okupasi', 'Kategori Risiko Okupasi',
+    'INSURED NAME', 'NO POLIS', 'NO SERTIFIKAT', 'NO KLAIM',
+    'INCEPTION DATE', 'EXPIRY DATE', 'Sumber Data'
+]
+additional_columns = [
+    'Premi Gross', 'Akuisisi', 'Premi Reas', 'Komisi Reas',
+    'Paid Claim', 'Recovery Klaim Reas', 'OS Claim', 'Recovery OS Claim Reas'
+]
+
+# Rename kolom nominal per sumber data
+rename_columns_premi = {
+    'PREMI IDR': 'Premi Gross',
+    'AKUISISI': 'Akuisisi',
+    'PREMI REAS IDR': 'Premi Reas',
+    'KOMISI REAS IDR': 'Komisi Reas'
+}
+rename_columns_klaim = {
+    'CLAIM AMOUNT (IDR)': 'Paid Claim',
+    'KLAIM REAS': 'Recovery Klaim Reas'
+}
+rename_columns_osklaim = {
+    'Gross OS Klaim': 'OS Claim',
+    'Reas': 'Recovery OS Claim Reas'
+}
+source_rename_columns = {
+    'Premi': rename_columns_premi,
+    'Klaim': rename_columns_klaim,
+    'OS Klaim': rename_columns_osklaim,
+}
+
+# Hash isi file, dipakai sebagai kunci cache dan nama snapshot
+def content_hash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+# Lokasi snapshot Parquet (bisa diganti lewat environment variable)
+SNAPSHOT_DIR = os.environ.get("LR_SNAPSHOT_DIR", "snapshots")
+
+# Path snapshot Parquet untuk satu sumber data + hash file
+def snapshot_path(sumber_data, content_hash):
+    slug = sumber_data.lower().replace(" ", "_")
+    return os.path.join(SNAPSHOT_DIR, f"{slug}_{content_hash[:16]}.parquet")
+
+# Daftar snapshot yang tersimpan untuk satu sumber data, terbaru di atas
+def list_snapshots(sumber_data):
+    slug = sumber_data.lower().replace(" ", "_")
+    paths = glob.glob(os.path.join(SNAPSHOT_DIR, f"{slug}_*.parquet"))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+# Kolom object dengan tipe campuran (mis. angka dan teks di NO POLIS) tidak bisa
+# ditulis ke Parquet, jadi nilai non-null-nya diseragamkan menjadi string
+def to_arrow_safe(df):
+    df = df.copy()
+    for col in df.select_dtypes(include="object").columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def write_snapshot(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    to_arrow_safe(df).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+# Baca snapshot Parquet secara memory-mapped
+def read_snapshot(path):
+    return pd.read_parquet(path, memory_map=True)
+
+# Ukuran chunk (baris) untuk mode streaming
+STREAMING_CHUNK_ROWS = 50_000
+
+# Memori proses saat ini (RSS) dalam byte
+def current_memory():
+    return psutil.Process().memory_info().rss
+
+# RSS tertinggi seumur proses dalam byte (ru_maxrss: KB di Linux, byte di macOS)
+def max_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Jeda sampling RSS (detik) selama ada tahap yang berjalan
+MEMORY_SAMPLE_INTERVAL = 0.01
+
+# Sampler memori: satu thread latar per proses (dibuat saat pertama dibutuhkan) yang selama
+# ada tahap aktif membaca RSS setiap MEMORY_SAMPLE_INTERVAL detik dan menaikkan 'memory'
+# setiap tahap aktif, sehingga objek sementara yang dibebaskan sebelum tahap selesai tetap
+# tercatat. Tanpa tahap aktif thread menunggu tanpa sampling.
+class MemorySampler:
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.reset()
+
+    # Dipanggil juga di proses anak (fork process pool): thread induk tidak ikut ter-fork
+    def reset(self):
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, record):
+        with self.lock:
+            self.active[id(record)] = record
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="lossratio-memory", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def remove(self, record):
+        with self.lock:
+            self.active.pop(id(record), None)
+
+    def run(self):
+        process = psutil.Process()
+        while True:
+            self.wake.wait()
+            memory = process.memory_info().rss
+            with self.lock:
+                if not self.active:
+                    self.wake.clear()
+                    continue
+                for record in self.active.values():
+                    record['memory'] = max(record['memory'], memory)
+            time.sleep(self.interval)
+
+memory_sampler = MemorySampler()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=memory_sampler.reset)
+
+# Instrumentasi performa. Setiap tahap mencatat waktu (wall time), jumlah baris
+# masuk/keluar dan memori puncak: RSS tertinggi dari awal, akhir dan sampling selama
+# tahap, atau puncak RSS seumur proses (ru_maxrss) jika puncak itu naik selama tahap.
+# Record ditulis ke logger "lossratio" sebagai satu baris JSON dan ke PerfLog yang aktif
+# di context saat ini (dashboard menyimpan satu PerfLog per session).
+logger = logging.getLogger("lossratio")
+active_perf_log = contextvars.ContextVar("active_perf_log", default=None)
+
+class PerfLog:
+    def __init__(self, max_records=5000, **context):
+        self.records = deque(maxlen=max_records)
+        self.context = {**context, 'run': 0, 'scope': None}
+
+    # Mulai run baru (full rerun atau rerun fragment) dan aktifkan log di context ini
+    def start_run(self, scope):
+        self.context['run'] += 1
+        self.context['scope'] = scope
+        active_perf_log.set(self)
+
+    def end_run(self):
+        self.context['scope'] = None
+
+    def to_frame(self):
+        return pd.DataFrame(list(self.records))
+
+@contextlib.contextmanager
+def stage(name, detail=None, rows_in=None):
+    perf_log = active_perf_log.get()
+    record = {**(perf_log.context if perf_log else {}), 'stage': name, 'detail': detail,
+              'rows_in': rows_in, 'rows_out': None, 'memory': current_memory()}
+    max_memory_start = max_memory()
+    memory_sampler.add(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        memory_sampler.remove(record)
+        memory = max(record['memory'], current_memory())
+        max_memory_end = max_memory()
+        # Puncak seumur proses yang naik selama tahap terjadi di dalam tahap ini
+        if max_memory_end is not None and max_memory_end > max_memory_start:
+            memory = max(memory, max_memory_end)
+        record['memory'] = memory
+        if perf_log is not None:
+            perf_log.records.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record, default=str))
+
+# Hash 64-bit per baris dari kolom kunci deduplikasi. Kolom numerik diseragamkan
+# ke float64 supaya 5 dan 5.0 dari chunk berbeda menghasilkan hash yang sama.
+def hash_key_columns(df, key_columns):
+    return hash_rows(df[key_columns])
+
+# Hash 64-bit per baris dengan tipe data diseragamkan (angka -> float64, kategori/string
+# -> object, urutan kolom menurut nama) agar isi yang sama dengan tipe hasil parse
+# berbeda menghasilkan hash yang sama
+def hash_rows(df):
+    df = df[sorted(df.columns, key=str)].copy()
+    for col in df.columns:
+        if pd.api.types.is_bool_dtype(df[col]) or pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype('float64')
+        elif isinstance(df[col].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+# Konversi tipe data per chunk agar kolom yang terkumpul tetap ringkas
+def coerce_chunk(chunk):
+    for col in chunk.columns:
+        if col in additional_columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        elif col in ('INCEPTION DATE', 'EXPIRY DATE'):
+            chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+        elif col in ('TOC_MOD', 'Kategori Okupasi', 'Kategori Risiko Okupasi', 'Sumber Data'):
+            chunk[col] = chunk[col].astype('category')
+    return chunk
+
+# Gabungkan chunk; kolom kategori disatukan dengan union_categoricals
+# agar tidak kembali menjadi object saat concat
+def concat_chunks(chunks, columns):
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    category_columns = [
+        col for col in chunks[0].columns if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)
+    ]
+    categories = {
+        col: pd.api.types.union_categoricals([chunk[col] for chunk in chunks]) for col in category_columns
+    }
+    df = pd.concat([chunk.drop(columns=category_columns) for chunk in chunks], ignore_index=True)
+    for col, values in categories.items():
+        df[col] = values
+    return df[chunks[0].columns]
+
+# Baca sheet pertama baris per baris (openpyxl read-only) dalam chunk. Drop kolom
+# Unnamed, deduplikasi (dengan index hash kunci lintas chunk), rename dan konversi
+# tipe dilakukan per chunk sehingga memori puncak tidak bergantung pada ukuran file.
+def read_excel_streaming(file, sumber_data, key_columns, chunk_rows=STREAMING_CHUNK_ROWS):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [
+            f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)
+        ]
+        keep_columns = [col for col in columns if not col.startswith("Unnamed")]
+        seen_keys = np.empty(0, dtype=np.uint64)
+        chunks = []
+        peak_memory = current_memory()
+        while True:
+            batch = list(itertools.islice(rows, chunk_rows))
+            if not batch:
+                break
+            chunk = pd.DataFrame.from_records(batch, columns=columns)[keep_columns]
+            chunk['Sumber Data'] = sumber_data
+            hashes = hash_key_columns(chunk, key_columns)
+            is_new = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen_keys)
+            seen_keys = np.concatenate([seen_keys, hashes[is_new]])
+            chunk = chunk[is_new].rename(columns=source_rename_columns[sumber_data])
+            chunks.append(coerce_chunk(chunk))
+            peak_memory = max(peak_memory, current_memory())
+    finally:
+        workbook.close()
+    df = concat_chunks(chunks, keep_columns + ['Sumber Data'])
+    df.attrs['peak_memory'] = max(peak_memory, current_memory())
+    return df
+
+# Baca, bersihkan dan deduplikasi satu sumber data. parsed_df diisi jika file
+# sudah di-parse sebelumnya.
+def read_source(file, sumber_data, key_columns, streaming=False, parsed_df=None):
+    if streaming:
+        with stage('parse_excel_streaming', sumber_data) as record:
+            df = read_excel_streaming(file, sumber_data, key_columns)
+            record['rows_out'] = len(df)
+        return df
+    if parsed_df is not None:
+        df = drop_unnamed(parsed_df)
+    else:
+        with stage('parse_excel', sumber_data) as record:
+            df = read_excel(file)
+            record['rows_out'] = len(df)
+    df['Sumber Data'] = sumber_data
+    with stage('dedup', sumber_data, rows_in=len(df)) as record:
+        df = df.drop_duplicates(subset=key_columns, keep='first')
+        record['rows_out'] = len(df)
+    return df
+
+# Baca beberapa sumber data sekaligus di process pool. Setiap worker menjalankan
+# read_source penuh (parse, drop kolom Unnamed, deduplikasi) untuk satu file, sehingga
+# proses utama hanya menerima hasil akhirnya. files: {sumber_data: (file_bytes, key_columns)};
+# on_done(sumber_data, selesai, total) dipanggil setiap satu file selesai.
+def read_sources_parallel(files, on_done=None):
+    sources = {}
+    context = multiprocessing.get_context("spawn")
+    with stage('read_sources_parallel', ", ".join(files)) as record, \
+            ProcessPoolExecutor(max_workers=len(files), mp_context=context) as executor:
+        futures = {
+            executor.submit(read_source, io.BytesIO(file_bytes), sumber_data, key_columns): sumber_data
+            for sumber_data, (file_bytes, key_columns) in files.items()
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            sumber_data = futures[future]
+            sources[sumber_data] = future.result()
+            if on_done:
+                on_done(sumber_data, done, len(futures))
+        record['rows_out'] = sum(len(df) for df in sources.values())
+    return sources
+
+# Lokasi data inkremental: per sumber data disimpan beberapa part Parquet beserta
+# index kunci hash 64-bit (terurut) dan manifest file yang sudah pernah digabung
+INCREMENTAL_DIR = os.path.join(SNAPSHOT_DIR, "incremental")
+
+def incremental_manifest_path(sumber_data):
+    slug = sumber_data.lower().replace(" ", "_")
+    return os.path.join(INCREMENTAL_DIR, f"{slug}_manifest.json")
+
+def load_incremental_manifest(sumber_data):
+    path = incremental_manifest_path(sumber_data)
+    if not os.path.exists(path):
+        return {'parts': []}
+    with open(path) as f:
+        return json.load(f)
+
+# Lock untuk load-ubah-simpan manifest dan penghapusan data inkremental: threading.Lock
+# untuk session dalam satu proses, flock untuk proses lain yang berbagi direktori
+incremental_thread_lock = threading.Lock()
+
+@contextlib.contextmanager
+def incremental_lock():
+    with incremental_thread_lock:
+        os.makedirs(INCREMENTAL_DIR, exist_ok=True)
+        with open(os.path.join(INCREMENTAL_DIR, ".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def save_incremental_manifest(sumber_data, manifest):
+    path = incremental_manifest_path(sumber_data)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+# Gabungkan upload baru ke data inkremental. Kunci hash upload dicari (binary search)
+# di index tiap part yang sudah ada, jadi waktunya sebanding dengan ukuran delta,
+# bukan ukuran seluruh histori. Baris dengan kunci yang sudah ada tetapi isinya
+# berbeda dihitung sebagai "berubah" dan, seperti drop_duplicates(keep='first'),
+# tetap memakai versi yang pertama tersimpan.
+def append_incremental(sumber_data, content_hash, df, key_columns):
+    with incremental_lock():
+        return append_incremental_locked(sumber_data, content_hash, df, key_columns)
+
+def append_incremental_locked(sumber_data, content_hash, df, key_columns):
+    manifest = load_incremental_manifest(sumber_data)
+    for part in manifest['parts']:
+        if part['content_hash'] == content_hash:
+            return part['stats']
+
+    rename_columns = source_rename_columns[sumber_data]
+    df = df.rename(columns=rename_columns)
+    key_hashes = hash_key_columns(df, [rename_columns.get(col, col) for col in key_columns])
+    row_hashes = hash_rows(df)
+
+    is_new = np.ones(len(df), dtype=bool)
+    is_changed = np.zeros(len(df), dtype=bool)
+    for part in manifest['parts']:
+        if part['index'] is None:
+            continue
+        stored = np.load(os.path.join(INCREMENTAL_DIR, part['index']), mmap_mode='r')
+        stored_keys, stored_rows = stored[0], stored[1]
+        pos = np.minimum(np.searchsorted(stored_keys, key_hashes), len(stored_keys) - 1)
+        found = stored_keys[pos] == key_hashes
+        is_changed |= found & (stored_rows[pos] != row_hashes)
+        is_new &= ~found
+
+    stats = {
+        'new': int(is_new.sum()),
+        'changed': int(is_changed.sum()),
+        'duplicate': int(len(df) - is_new.sum() - is_changed.sum()),
+    }
+    part = {'content_hash': content_hash, 'data': None, 'index': None, 'stats': stats}
+    if stats['new']:
+        # Nama part memuat hash isi file sehingga data baru setelah penghapusan tidak
+        # pernah memakai nama (dan kunci cache) part lama
+        slug = sumber_data.lower().replace(" ", "_")
+        part_name = f"{slug}_part_{len(manifest['parts']):04d}_{content_hash[:12]}"
+        order = np.argsort(key_hashes[is_new])
+        index = np.vstack([key_hashes[is_new][order], row_hashes[is_new][order]])
+        np.save(os.path.join(INCREMENTAL_DIR, f"{part_name}.npy"), index)
+        write_snapshot(df[is_new], os.path.join(INCREMENTAL_DIR, f"{part_name}.parquet"))
+        part['data'] = f"{part_name}.parquet"
+        part['index'] = f"{part_name}.npy"
+    manifest['parts'].append(part)
+    save_incremental_manifest(sumber_data, manifest)
+    return stats
+
+# Seluruh data inkremental satu sumber
+def read_incremental(part_files):
+    parts = [read_snapshot(os.path.join(INCREMENTAL_DIR, name)) for name in part_files]
+    return pd.concat(parts, ignore_index=True)
+
+def incremental_part_files(sumber_data):
+    return tuple(part['data'] for part in load_incremental_manifest(sumber_data)['parts'] if part['data'])
+
+# Hapus seluruh data inkremental (dipakai bersama semua session) di bawah lock yang sama
+# dengan penggabungan, sehingga tidak ada part yang setengah tertulis
+def clear_incremental():
+    with incremental_lock():
+        for path in glob.glob(os.path.join(INCREMENTAL_DIR, "*")):
+            os.remove(path)
+
+# Registry dataset bersama: dataset bernama (mis. "Closing 2026-09") berisi ketiga sumber
+# yang sudah dideduplikasi, disimpan per versi di DATASET_DIR/<nama>/v<versi>/
+DATASET_DIR = os.path.join(SNAPSHOT_DIR, "datasets")
+dataset_sources = {'Premi': 'premi.parquet', 'Klaim': 'klaim.parquet', 'OS Klaim': 'os_klaim.parquet'}
+
+def dataset_slug(name):
+    return "".join(c if c.isalnum() or c in "-." else "_" for c in name.strip().lower())
+
+# Simpan ketiga sumber sebagai versi baru dataset bernama; mengembalikan path versinya
+def publish_dataset(name, sources):
+    dataset_dir = os.path.join(DATASET_DIR, dataset_slug(name))
+    version, path = claim_dataset_version(dataset_dir)
+    for sumber_data, file_name in dataset_sources.items():
+        write_snapshot(sources[sumber_data], os.path.join(path, file_name))
+    manifest = {
+        'name': name.strip(),
+        'version': version,
+        'created': pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"),
+        'rows': {sumber_data: len(sources[sumber_data]) for sumber_data in dataset_sources},
+    }
+    # Manifest ditulis terakhir sehingga versi yang belum lengkap tidak ikut terdaftar
+    with open(os.path.join(path, "dataset.json.tmp"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(path, "dataset.json.tmp"), os.path.join(path, "dataset.json"))
+    return path
+
+# Klaim folder versi berikutnya secara atomik (os.makedirs gagal jika folder sudah ada),
+# sehingga dua pengguna yang menyimpan nama yang sama bersamaan mendapat versi berbeda.
+# Folder versi yang belum punya manifest (sedang ditulis atau gagal) tetap dilewati.
+def claim_dataset_version(dataset_dir):
+    os.makedirs(dataset_dir, exist_ok=True)
+    while True:
+        versions = [
+            int(name[1:]) for name in os.listdir(dataset_dir)
+            if name.startswith("v") and name[1:].isdigit()
+        ]
+        version = max(versions, default=0) + 1
+        path = os.path.join(dataset_dir, f"v{version}")
+        try:
+            os.makedirs(path, exist_ok=False)
+        except FileExistsError:
+            continue
+        return version, path
+
+# Daftar versi dataset yang terdaftar (manifest + path), terbaru di atas
+def list_datasets():
+    datasets = [
+        dataset_manifest(os.path.dirname(manifest_path))
+        for manifest_path in glob.glob(os.path.join(DATASET_DIR, "*", "v*", "dataset.json"))
+    ]
+    return sorted(datasets, key=lambda manifest: (manifest['created'], manifest['version']), reverse=True)
+
+def dataset_manifest(path):
+    with open(os.path.join(path, "dataset.json")) as f:
+        manifest = json.load(f)
+    manifest['path'] = path
+    return manifest
+
+# Path Parquet ketiga sumber satu versi dataset (dipakai langsung oleh backend DuckDB)
+def dataset_source_paths(path):
+    return {sumber_data: os.path.join(path, file_name) for sumber_data, file_name in dataset_sources.items()}
+
+def read_dataset(path):
+    with stage('read_dataset', os.path.basename(os.path.dirname(path))) as record:
+        sources = {
+            sumber_data: read_snapshot(source_path) for sumber_data, source_path in dataset_source_paths(path).items()
+        }
+        record['rows_out'] = sum(len(df) for df in sources.values())
+        return sources
+
+# Skema tipe data kolom setelah TOC_MOD di-rename menjadi TOC.
+# Kolom nominal di additional_columns selalu float64.
+column_dtypes = {
+    'AY': 'Int64',
+    'UY': 'Int64',
+    'TOC': 'category',
+    'Kategori Okupasi': 'category',
+    'Kategori Risiko Okupasi': 'category',
+    'INSURED NAME': 'category',
+    'NO POLIS': 'string',
+    'NO SERTIFIKAT': 'string',
+    'NO KLAIM': 'string',
+    'INCEPTION DATE': 'datetime64[ns]',
+    'EXPIRY DATE': 'datetime64[ns]',
+    'Sumber Data': 'category',
+}
+
+# Rapikan kolom teks tanpa astype(str) per baris: strip hanya dilakukan pada nilai unik,
+# lalu kode kategorinya dipetakan ulang (nilai yang sama setelah strip digabung)
+def normalize_text(series, dtype):
+    codes, uniques = pd.factorize(series)
+    labels = pd.Index(uniques.astype(str)).str.strip()
+    remap, categories = pd.factorize(labels, sort=True)
+    codes = np.where(codes >= 0, remap[codes], -1)
+    result = pd.Categorical.from_codes(codes, categories=categories)
+    result = pd.Series(result, index=series.index, name=series.name)
+    return result if dtype == 'category' else result.astype('string')
+
+def normalize_column(series, dtype):
+    if dtype in ('category', 'string'):
+        return normalize_text(series, dtype)
+    if dtype == 'Int64':
+        return pd.to_numeric(series, errors='coerce').round().astype('Int64')
+    if dtype.startswith('datetime64'):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        return pd.to_datetime(series, errors='coerce')
+    return pd.to_numeric(series, errors='coerce').astype(dtype)
+
+# Rename kolom nominal, tumpuk ketiga sumber lalu normalisasi sesuai skema
+def combine_sources(df_premi, df_klaim, df_os_klaim):
+    with stage('concat', rows_in=len(df_premi) + len(df_klaim) + len(df_os_klaim)) as record:
+        df_combined = pd.concat([
+            df_premi.rename(columns=rename_columns_premi),
+            df_klaim.rename(columns=rename_columns_klaim),
+            df_os_klaim.rename(columns=rename_columns_osklaim),
+        ], ignore_index=True)
+        record['rows_out'] = len(df_combined)
+    return normalize_combined(df_combined)
+
+# Bentuk dataframe gabungan dengan kolom dan tipe data sesuai skema
+def normalize_combined(df):
+    with stage('normalize', rows_in=len(df)) as record:
+        df = df.rename(columns={"TOC_MOD": "TOC"})
+        columns = {}
+        for col, dtype in column_dtypes.items():
+            if col not in df.columns:
+                continue
+            if dtype.startswith('datetime64'):
+                with stage('parse_dates', col, rows_in=len(df)) as date_record:
+                    columns[col] = normalize_column(df[col], dtype)
+                    date_record['rows_out'] = int(columns[col].notna().sum())
+            else:
+                columns[col] = normalize_column(df[col], dtype)
+        for col in additional_columns:
+            if col in df.columns:
+                columns[col] = normalize_column(df[col], 'float64')
+            else:
+                columns[col] = pd.Series(np.nan, index=df.index, dtype='float64')
+        df = pd.DataFrame(columns, index=df.index)
+        record['rows_out'] = len(df)
+    return df
+
+# Measure per sumber data untuk fact table hasil join
+source_measures = {
+    'Premi': ['Premi Gross', 'Akuisisi', 'Premi Reas', 'Komisi Reas'],
+    'Klaim': ['Paid Claim', 'Recovery Klaim Reas'],
+    'OS Klaim': ['OS Claim', 'Recovery OS Claim Reas'],
+}
+fact_dimensions = [
+    'AY', 'UY', 'TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi',
+    'INSURED NAME', 'NO POLIS', 'NO SERTIFIKAT', 'INCEPTION DATE', 'EXPIRY DATE'
+]
+
+# Dimensi milik polis; baris klaim yang menemukan polisnya memakai nilai dari data premi
+policy_dimensions = [
+    'UY', 'TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi',
+    'INSURED NAME', 'INCEPTION DATE', 'EXPIRY DATE'
+]
+
+# Kunci join: NO POLIS (+ NO SERTIFIKAT) yang terisi di ketiga sumber. Join di grain
+# INSURED NAME akan menggabungkan semua polis satu insured (UY, TOC dan tanggal polis
+# pertama terbawa ke polis lain), sehingga ditolak.
+def policy_join_keys(df):
+    parts = [df[df['Sumber Data'] == sumber_data] for sumber_data in source_measures]
+    keys = [
+        col for col in ['NO POLIS', 'NO SERTIFIKAT']
+        if col in df.columns and all(part[col].notna().any() for part in parts)
+    ]
+    if 'NO POLIS' not in keys:
+        raise ValueError("Join per polis membutuhkan kolom NO POLIS yang terisi di data Premi, Klaim dan OS Klaim")
+    return keys
+
+# Baris yang kuncinya tidak lengkap diberi kunci unik per baris agar tidak tergabung
+# dengan baris lain (dan tidak ter-join ke polis mana pun)
+MISSING_KEY_PREFIX = "<tanpa kunci"
+
+def fill_missing_keys(part, sumber_data, keys):
+    part = part.copy()
+    missing = part[keys].isna().any(axis=1).to_numpy()
+    for col in keys:
+        part[col] = part[col].astype('string')
+    if missing.any():
+        part.loc[missing, keys[0]] = [f"{MISSING_KEY_PREFIX} - {sumber_data} - {i}>" for i in np.flatnonzero(missing)]
+        for col in keys[1:]:
+            part.loc[missing, col] = part.loc[missing, col].fillna("")
+    return part
+
+# Ringkas satu sumber ke grain kunci join (+ AY untuk klaim). Jumlah Klaim = jumlah
+# baris dengan NO KLAIM terisi, sama seperti frekuensi pada data bertumpuk.
+def aggregate_source(part, sumber_data, keys, by=()):
+    part = fill_missing_keys(part, sumber_data, keys)
+    group_keys = keys + list(by)
+    dims = [col for col in fact_dimensions if col in part.columns and col not in group_keys]
+    measures = source_measures[sumber_data]
+    grouped = part.groupby(group_keys, observed=True, sort=False, dropna=False)
+    result = grouped.agg({**{col: 'first' for col in dims}, **{col: 'sum' for col in measures}})
+    result['Jumlah Baris'] = grouped.size()
+    if sumber_data != 'Premi':
+        result['Jumlah Klaim'] = grouped['NO KLAIM'].count() if 'NO KLAIM' in part.columns else 0
+    return result
+
+# Fact table tingkat polis: premi, klaim dibayar dan OS klaim di-join (hash join pada
+# kunci polis) alih-alih ditumpuk. Grain-nya polis x AY: premi per polis berada di
+# baris AY data premi, klaim per AY-nya sendiri, sehingga triangle UY x AY tetap utuh.
+# Dimensi polis (UY, TOC, kategori, tanggal) diambil dari data premi jika polisnya
+# ditemukan. Nominal yang tidak ada diisi 0; Jumlah Klaim dari Klaim dan OS Klaim
+# dijumlahkan. Match rate = porsi baris klaim/OS yang menemukan polis di data premi.
+def build_policy_fact(df):
+    with stage('policy_join', rows_in=len(df)) as record:
+        keys = policy_join_keys(df)
+        premi = aggregate_source(df[df['Sumber Data'] == 'Premi'], 'Premi', keys).drop(columns='Jumlah Baris')
+        claims = []
+        match_rates = {}
+        for sumber_data in ['Klaim', 'OS Klaim']:
+            part = aggregate_source(df[df['Sumber Data'] == sumber_data], sumber_data, keys, by=['AY'])
+            matched = part.index.droplevel('AY').isin(premi.index)
+            match_rates[sumber_data] = part.loc[matched, 'Jumlah Baris'].sum() / max(part['Jumlah Baris'].sum(), 1)
+            claims.append(part.drop(columns='Jumlah Baris').reset_index())
+        claims = pd.concat(claims, ignore_index=True)
+
+        # Dimensi polis dari premi untuk klaim yang polisnya ditemukan
+        dims = [col for col in policy_dimensions if col in premi.columns and col in claims.columns]
+        claims = claims.merge(premi[dims], left_on=keys, right_index=True, how='left', suffixes=('', ' (polis)'))
+        for col in dims:
+            claims[col] = claims.pop(f"{col} (polis)").combine_first(claims[col])
+
+        stacked = pd.concat([premi.reset_index(), claims], ignore_index=True)
+        group_keys = keys + ['AY']
+        measures = [col for col in additional_columns if col in stacked.columns] + ['Jumlah Klaim']
+        fact_dims = [col for col in fact_dimensions if col in stacked.columns and col not in group_keys]
+        fact = stacked.groupby(group_keys, sort=False, dropna=False).agg(
+            {**{col: 'first' for col in fact_dims}, **{col: 'sum' for col in measures}}
+        ).reset_index()
+        for col in keys:
+            fact[col] = fact[col].mask(fact[col].str.startswith(MISSING_KEY_PREFIX))
+
+        for col in additional_columns:
+            if col not in fact.columns:
+                fact[col] = 0.0
+        fact['Jumlah Klaim'] = fact['Jumlah Klaim'].astype('int64')
+        for col, dtype in column_dtypes.items():
+            if col in fact.columns:
+                fact[col] = normalize_column(fact[col], dtype)
+        columns = [col for col in column_dtypes if col in fact.columns] + additional_columns + ['Jumlah Klaim']
+        record['rows_out'] = len(fact)
+    return fact[columns], match_rates
+
+# Dimensi cube agregasi; tanggal diringkas ke awal bulan
+cube_dimensions = [
+    'UY', 'TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi',
+    'INCEPTION MONTH', 'EXPIRY MONTH'
+]
+
+# Tanggal inception/expiry yang dibulatkan ke awal bulan, sebagai kunci groupby
+def month_keys(df):
+    keys = []
+    for date_col, month_col in [('INCEPTION DATE', 'INCEPTION MONTH'), ('EXPIRY DATE', 'EXPIRY MONTH')]:
+        months = df[date_col].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+        keys.append(pd.Series(months, index=df.index, name=month_col))
+    return keys
+
+# Cube pra-agregasi: jumlah kedelapan measure per kombinasi dimensi.
+# Dibangun sekali per dataset, sehingga summary, pie chart dan loss ratio cukup
+# me-roll-up cube, bukan scan ulang seluruh polis.
+def build_cube(df):
+    with stage('build_cube', rows_in=len(df)) as record:
+        keys = [df[col] for col in cube_dimensions[:4]] + month_keys(df)
+        cube = df.groupby(keys, observed=True, dropna=False)[additional_columns].sum()
+        cube['Jumlah Baris'] = df.groupby(keys, observed=True, dropna=False).size()
+        record['rows_out'] = len(cube)
+    return cube.reset_index()
+
+# Filter tanggal bisa dilayani cube jika rentangnya tepat satu bulan penuh atau lebih
+def range_is_month_aligned(start_date, end_date):
+    return pd.Timestamp(start_date).day == 1 and pd.Timestamp(end_date).is_month_end
+
+def filter_cube(cube, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+                date_filter, date_range):
+    mask = np.ones(len(cube), dtype=bool)
+    if selected_toc:
+        mask &= cube['TOC'].isin(selected_toc).to_numpy()
+    if selected_kategori_okupasi:
+        mask &= cube['Kategori Okupasi'].isin(selected_kategori_okupasi).to_numpy()
+    if selected_risiko_okupasi:
+        mask &= cube['Kategori Risiko Okupasi'].isin(selected_risiko_okupasi).to_numpy()
+    if date_range and len(date_range) == 2:
+        start_date, end_date = date_range
+        month_col = 'INCEPTION MONTH' if date_filter == "INCEPTION DATE" else 'EXPIRY MONTH'
+        start_month = pd.Timestamp(start_date).to_period('M').start_time
+        end_month = pd.Timestamp(end_date).to_period('M').start_time
+        mask &= ((cube[month_col] >= start_month) & (cube[month_col] <= end_month)).to_numpy()
+    return cube[mask]
+
+# Index filter: bitmap (packed bits) per nilai untuk dimensi kategori, dan
+# index terurut untuk kolom tanggal. Filter sidebar cukup menjadi operasi
+# OR/AND bitmap + binary search, tanpa membuat salinan dataframe di tiap langkah.
+class FilterIndex:
+    category_columns = ['TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi']
+    date_columns = ['INCEPTION DATE', 'EXPIRY DATE']
+
+    def __init__(self, df):
+        with stage('build_filter_index', rows_in=len(df)):
+            self.n_rows = len(df)
+            self.bitmaps = {}
+            for col in self.category_columns:
+                codes, uniques = pd.factorize(df[col])
+                self.bitmaps[col] = {
+                    value: np.packbits(codes == code) for code, value in enumerate(uniques)
+                }
+            self.date_order = {}
+            self.date_sorted = {}
+            for col in self.date_columns:
+                values = df[col].to_numpy(dtype='datetime64[ns]')
+                order = np.argsort(values, kind='stable')
+                n_valid = int((~np.isnat(values)).sum())  # NaT selalu di urutan paling akhir
+                self.date_order[col] = order[:n_valid]
+                self.date_sorted[col] = values[order[:n_valid]]
+
+    def _category_bits(self, col, selected_values):
+        empty = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        bitmaps = [self.bitmaps[col].get(value, empty) for value in selected_values]
+        return np.bitwise_or.reduce(bitmaps)
+
+    def _date_bits(self, col, start_date, end_date):
+        sorted_values = self.date_sorted[col]
+        lo = np.searchsorted(sorted_values, pd.Timestamp(start_date).to_datetime64(), side='left')
+        hi = np.searchsorted(sorted_values, pd.Timestamp(end_date).to_datetime64(), side='right')
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.date_order[col][lo:hi]] = True
+        return np.packbits(mask)
+
+    # Posisi baris yang lolos filter, atau None jika tidak ada filter aktif
+    def select(self, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+               date_filter, date_range):
+        bits = []
+        for col, selected_values in zip(self.category_columns,
+                                        [selected_toc, selected_kategori_okupasi, selected_risiko_okupasi]):
+            if selected_values:
+                bits.append(self._category_bits(col, selected_values))
+        if date_range and len(date_range) == 2:
+            bits.append(self._date_bits(date_filter, *date_range))
+        if not bits:
+            return None
+        mask = np.unpackbits(np.bitwise_and.reduce(bits), count=self.n_rows).astype(bool)
+        return np.flatnonzero(mask)
+
+# Terapkan filter sidebar. Mengembalikan data baris yang lolos filter dan sumber
+# agregasi: cube yang difilter jika filter tanggal sejajar bulan, selain itu data baris.
+def select_rows(df, cube, filter_index, selected_toc, selected_kategori_okupasi,
+                selected_risiko_okupasi, date_filter, date_range):
+    with stage('filter', rows_in=len(df)) as record:
+        filtered_positions = filter_index.select(selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+                                                 date_filter, date_range)
+        filtered_df = df if filtered_positions is None else df.take(filtered_positions)
+        record['rows_out'] = len(filtered_df)
+    if not (date_range and len(date_range) == 2) or range_is_month_aligned(*date_range):
+        with stage('filter_cube', rows_in=len(cube)) as record:
+            agg_df = filter_cube(cube, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+                                 date_filter, date_range)
+            record['rows_out'] = len(agg_df)
+    else:
+        agg_df = filtered_df
+    return filtered_df, agg_df
+
+# Dimensi kategori untuk pie chart premi dan klaim
+breakdown_dimensions = ['TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi']
+
+# Top N insured tanpa groupby string: kode kategori INSURED NAME dipakai sebagai ID
+# integer, nilai dijumlah dengan np.bincount lalu N terbesar dipilih dengan argpartition.
+# drill_down = (kolom, nilai) membatasi perhitungan ke satu TOC/Kategori Okupasi.
+def top_n_insured(df, measure, top_n, drill_down=None):
+    insured = df["INSURED NAME"].cat
+    codes = insured.codes.to_numpy()
+    values = df[measure].to_numpy(dtype='float64', na_value=0.0)
+    valid = codes >= 0
+    if drill_down:
+        drill_column, drill_value = drill_down
+        valid &= (df[drill_column] == drill_value).to_numpy(dtype=bool, na_value=False)
+    totals = np.bincount(codes[valid], weights=values[valid], minlength=len(insured.categories))
+    present = np.flatnonzero(np.bincount(codes[valid], minlength=len(insured.categories)))
+    top_n = min(top_n, len(present))
+    if top_n == 0:
+        return pd.DataFrame({"INSURED NAME": pd.Series(dtype='object'), "Severity": pd.Series(dtype='float64')})
+    top = present[np.argpartition(-totals[present], top_n - 1)[:top_n]]
+    top = top[np.argsort(totals[top], kind='stable')]
+    return pd.DataFrame({"INSURED NAME": insured.categories[top], "Severity": totals[top]})
+
+# Loss ratio = (klaim dibayar + OS - recovery reas) / (premi - akuisisi - premi reas + komisi reas).
+# sums berupa Series total (hasil skalar) atau DataFrame per cell (hasil per baris).
+def net_incurred(sums):
+    return (sums["Paid Claim"] + sums["OS Claim"]) - (sums["Recovery Klaim Reas"] + sums["Recovery OS Claim Reas"])
+
+def net_premium(sums):
+    return sums["Premi Gross"] - sums["Akuisisi"] - sums["Premi Reas"] + sums["Komisi Reas"]
+
+def loss_ratio_of(sums):
+    return net_incurred(sums) / net_premium(sums)
+
+# Klaim incurred per baris (klaim dibayar + OS - recovery klaim reas)
+def incurred_values(df):
+    return (
+        df["Paid Claim"].fillna(0).to_numpy() +
+        df["OS Claim"].fillna(0).to_numpy() -
+        df["Recovery Klaim Reas"].fillna(0).to_numpy()
+    )
+
+# Hasil agregasi yang dipakai oleh bagian tampilan
+@dataclass
+class Aggregates:
+    summary_uy: pd.DataFrame
+    premi_by: dict
+    klaim_by: dict
+    premi_top: pd.DataFrame
+    klaim_top: pd.DataFrame
+    totals: pd.Series
+    loss_ratio: float
+    claim_frequency: int
+    incurred_average: float
+
+# Summary UY, pie chart dan loss ratio di-roll-up dari hasil groupby UY x dimensi
+# kategori (base), yang kecil berapa pun jumlah baris datanya
+def roll_up(base):
+    with stage('groupby', 'UY', rows_in=len(base)) as record:
+        summary_uy = base.groupby('UY')[additional_columns].sum().reset_index()
+        record['rows_out'] = len(summary_uy)
+    premi_by = {}
+    klaim_by = {}
+    for dim in breakdown_dimensions:
+        with stage('groupby', dim, rows_in=len(base)) as record:
+            by_dim = base.groupby(dim, observed=True, as_index=False)[['Premi Gross', 'Paid Claim']].sum()
+            record['rows_out'] = len(by_dim)
+        premi_by[dim] = by_dim[[dim, 'Premi Gross']]
+        klaim_by[dim] = by_dim[[dim, 'Paid Claim']]
+
+    totals = base[additional_columns].sum()
+    return summary_uy, premi_by, klaim_by, totals, loss_ratio_of(totals)
+
+# Hitung semua metrik halaman sekaligus. agg_df (cube atau data baris) cukup di-groupby
+# satu kali per UY x dimensi kategori lalu di-roll-up. Top 10 insured memakai satu
+# groupby untuk premi dan klaim.
+def compute_aggregates(agg_df, filtered_df, top_n=10, drill_down=None):
+    with stage('groupby', 'UY x ' + ' x '.join(breakdown_dimensions), rows_in=len(agg_df)) as record:
+        base = agg_df.groupby(['UY'] + breakdown_dimensions, observed=True, dropna=False)[additional_columns].sum()
+        base = base.reset_index()
+        record['rows_out'] = len(base)
+    summary_uy, premi_by, klaim_by, totals, loss_ratio = roll_up(base)
+
+    with stage('top_n', 'Premi Gross', rows_in=len(filtered_df)) as record:
+        premi_top = top_n_insured(filtered_df, "Premi Gross", top_n, drill_down)
+        record['rows_out'] = len(premi_top)
+    premi_top.columns = ["Insuredname", "Severity"]
+    with stage('top_n', 'Paid Claim', rows_in=len(filtered_df)) as record:
+        klaim_top = top_n_insured(filtered_df, "Paid Claim", top_n, drill_down)
+        record['rows_out'] = len(klaim_top)
+    klaim_top.columns = ["Claimant", "Severity"]
+
+    incurred = incurred_values(filtered_df)
+    if 'Jumlah Klaim' in filtered_df.columns:
+        # Fact table hasil join: satu baris per polis dengan jumlah klaimnya
+        claim_frequency = int(filtered_df['Jumlah Klaim'].sum())
+        incurred_average = incurred.sum() / claim_frequency if claim_frequency else np.nan
+    else:
+        is_claim = filtered_df["NO KLAIM"].notna().to_numpy()
+        claim_frequency = int(is_claim.sum())
+        incurred_average = incurred[is_claim].mean() if claim_frequency else np.nan
+
+    return Aggregates(
+        summary_uy=summary_uy,
+        premi_by=premi_by,
+        klaim_by=klaim_by,
+        premi_top=premi_top,
+        klaim_top=klaim_top,
+        totals=totals,
+        loss_ratio=loss_ratio,
+        claim_frequency=claim_frequency,
+        incurred_average=incurred_average,
+    )
+
+# Ringkas angka besar (T/B/M) secara vektor untuk label chart
+def simplify_numbers(values):
+    values = np.asarray(values, dtype='float64')
+    tier = np.select([values >= 1e12, values >= 1e9, values >= 1e6], [0, 1, 2], default=3)
+    divisor = np.array([1e12, 1e9, 1e6, 1.0])[tier]
+    suffix = np.array([" T", " B", " M", ""])[tier]
+    text = np.char.add(np.char.mod("%.1f", values / divisor), suffix).astype(object)
+    small = tier == 3
+    text[small] = [f"{value:,.0f}" for value in values[small]]
+    return text
+
+# Tabel summary per UY beserta baris Grand Total (nilai tetap numerik)
+def uy_summary_table(summary_uy):
+    summary_df = summary_uy[['UY'] + additional_columns].sort_values('UY', ascending=True)
+    summary_df = summary_df.reset_index(drop=True)
+    summary_df['UY'] = summary_df['UY'].astype(str)
+    grand_total = summary_df[additional_columns].sum()
+    grand_total_df = pd.DataFrame([grand_total], columns=additional_columns)
+    grand_total_df['UY'] = 'Grand Total'
+    return pd.concat([summary_df, grand_total_df], ignore_index=True)
+
+# Premi dan klaim per TOC / Kategori Okupasi / Kategori Risiko Okupasi dalam satu tabel
+def breakdown_table(aggregates):
+    tables = []
+    for dim in breakdown_dimensions:
+        table = aggregates.premi_by[dim].merge(aggregates.klaim_by[dim], on=dim, how='outer')
+        table = table.rename(columns={dim: 'Nilai'})
+        table['Nilai'] = table['Nilai'].astype(str)
+        table.insert(0, 'Dimensi', dim)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+# Ringkasan loss ratio: total kedelapan measure, frekuensi klaim dan loss ratio
+def loss_ratio_table(aggregates, earned_loss_ratio=None):
+    table = aggregates.totals.to_frame().T
+    table['Frekuensi Klaim'] = aggregates.claim_frequency
+    table['Average Klaim Incurred'] = aggregates.incurred_average
+    table['Loss Ratio'] = aggregates.loss_ratio
+    if earned_loss_ratio is not None:
+        table['Loss Ratio (Earned)'] = earned_loss_ratio
+    return table
+
+# Backend agregasi. Keduanya menerima filter dengan nama argumen select_rows
+# (selected_toc, selected_kategori_okupasi, selected_risiko_okupasi, date_filter,
+# date_range) dan menyediakan tampilan yang sama: Aggregates, grid berhalaman,
+# statistik deskriptif, loss ratio earned, earned premium, cell triangle dan nilai severity.
+# - PandasBackend: cube + index bitmap di memori (default).
+# - DuckDBBackend: SQL atas tabel DuckDB (kolumnar, multi-thread, bisa spill ke disk),
+#   untuk dataset besar; data gabungan, cube dan index filter pandas tidak dibangun.
+
+# Kunci hashable untuk satu kombinasi filter
+def filter_key(filters):
+    return tuple(
+        (name, tuple(value) if isinstance(value, (list, tuple)) else value)
+        for name, value in sorted(filters.items())
+    )
+
+class PandasBackend:
+    name = "pandas"
+
+    def __init__(self, df, cube, filter_index, triangle=None):
+        self.df = df
+        self.cube = cube
+        self.filter_index = filter_index
+        self.triangle = triangle
+        self.columns = list(df.columns)
+        self.n_rows = len(df)
+        self.selection = None
+
+    # Hasil select_rows (filtered_df, agg_df) untuk filter terakhir; tampilan lain dalam
+    # rerun yang sama memakai seleksi ini tanpa memfilter ulang
+    def rows(self, filters):
+        key = filter_key(filters)
+        selection = self.selection
+        if selection is None or selection[0] != key:
+            selection = (key, select_rows(self.df, self.cube, self.filter_index, **filters))
+            self.selection = selection
+        return selection[1]
+
+    def aggregate(self, filters, top_n=10, drill_down=None):
+        filtered_df, agg_df = self.rows(filters)
+        return compute_aggregates(agg_df, filtered_df, top_n, drill_down)
+
+    def options(self, column):
+        return sorted(self.df[column].dropna().unique())
+
+    def date_bounds(self, column):
+        return self.df[column].min(), self.df[column].max()
+
+    def distinct(self, filters, column):
+        return sorted(self.rows(filters)[0][column].dropna().unique())
+
+    def count(self, filters):
+        return len(self.rows(filters)[0])
+
+    # Satu halaman baris yang lolos filter; pengurutan stabil seperti urutan data
+    def page(self, filters, sort_column=None, ascending=True, start=0, size=50):
+        filtered_df = self.rows(filters)[0]
+        if sort_column:
+            order = filtered_df[sort_column].sort_values(
+                ascending=ascending, na_position='last', kind='stable'
+            ).index
+            return filtered_df.loc[order[start:start + size]]
+        return filtered_df.iloc[start:start + size]
+
+    def describe(self, filters):
+        filtered_df = self.rows(filters)[0]
+        with stage('describe', rows_in=len(filtered_df)):
+            return filtered_df[additional_columns].describe()
+
+    def earned_loss_ratio(self, filters, valuation_date):
+        return earned_loss_ratio(self.rows(filters)[0], valuation_date)
+
+    def earned_premium_by_period(self, filters, freq='M', valuation_date=None):
+        return earned_premium_by_period(self.rows(filters)[0], freq, valuation_date)
+
+    def earned_loss_ratio_by_year(self, filters, valuation_date=None):
+        return earned_loss_ratio_by_year(self.rows(filters)[0], valuation_date)
+
+    # Cell triangle yang lolos filter; triangle dibangun sekali jika belum diberikan
+    def triangle_cells(self, filters):
+        if self.triangle is None:
+            self.triangle = LossTriangle().update(self.df)
+        return self.triangle.select(self.rows(filters)[0], filters['selected_toc'],
+                                    filters['selected_kategori_okupasi'], filters['selected_risiko_okupasi'],
+                                    filters['date_filter'], filters['date_range'])
+
+    def severity_values(self, filters, basis):
+        return severity_values(self.rows(filters)[0], basis)
+
+    def insured_density(self, filters, n_bins=50):
+        return insured_density(self.rows(filters)[0], n_bins)
+
+# Klaim incurred per baris dalam SQL (sama dengan incurred_values)
+incurred_sql = 'COALESCE("Paid Claim", 0) + COALESCE("OS Claim", 0) - COALESCE("Recovery Klaim Reas", 0)'
+
+def sql_name(col):
+    return '"' + str(col).replace('"', '""') + '"'
+
+def sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+# Ekspresi SQL yang menormalisasi satu kolom seperti normalize_column
+def normalize_sql(expression, dtype):
+    if dtype in ('category', 'string'):
+        whitespace = " || ".join(f"chr({code})" for code in (32, 9, 10, 11, 12, 13, 160))
+        return f"TRIM(CAST({expression} AS VARCHAR), {whitespace})"
+    if dtype == 'Int64':
+        return f"TRY_CAST(ROUND(TRY_CAST({expression} AS DOUBLE)) AS BIGINT)"
+    if dtype.startswith('datetime64'):
+        return f"TRY_CAST({expression} AS TIMESTAMP)"
+    if dtype == 'int64':
+        return f"TRY_CAST({expression} AS BIGINT)"
+    return f"TRY_CAST({expression} AS DOUBLE)"
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    # sources: {sumber_data: path Parquet, daftar path Parquet (part inkremental) atau
+    # DataFrame}, berisi kolom hasil read_source (snapshot, dataset bersama, data inkremental
+    # atau upload) atau data yang sudah dinormalisasi (fact table join per polis).
+    # Rename, tumpuk dan normalisasi seperti combine_sources dilakukan di
+    # SQL dan hasilnya disimpan sekali sebagai tabel DuckDB, tanpa salinan Parquet tambahan.
+    def __init__(self, sources, threads=None):
+        self.connection = duckdb.connect()
+        if threads:
+            self.connection.execute(f"SET threads = {int(threads)}")
+        with stage('duckdb_load', ", ".join(sources)) as record:
+            tables = []
+            for position, (sumber_data, source) in enumerate(sources.items()):
+                if isinstance(source, pd.DataFrame):
+                    table = f"sumber_{position}"
+                    self.connection.register(table, source)
+                else:
+                    paths = source if isinstance(source, (list, tuple)) else [source]
+                    paths = ", ".join(sql_string(path) for path in paths)
+                    table = f"read_parquet([{paths}], union_by_name = true)"
+                columns = [row[0] for row in self.connection.execute(f"DESCRIBE SELECT * FROM {table}").fetchall()]
+                tables.append((sumber_data, table, columns))
+            self.connection.execute(f"CREATE TABLE fakta AS {self.union_sql(tables)}")
+            for position, source in enumerate(sources.values()):
+                if isinstance(source, pd.DataFrame):
+                    self.connection.unregister(f"sumber_{position}")
+            self.columns = [row[0] for row in self.connection.execute("DESCRIBE fakta").fetchall()]
+            self.n_rows = self.connection.execute("SELECT COUNT(*) FROM fakta").fetchone()[0]
+            record['rows_out'] = self.n_rows
+
+    # Satu SELECT per sumber dengan kolom dan tipe sesuai skema, ditumpuk dengan UNION ALL
+    @staticmethod
+    def union_sql(tables):
+        schema = {col: dtype for col, dtype in column_dtypes.items()}
+        schema.update({col: 'float64' for col in additional_columns})
+        schema['Jumlah Klaim'] = 'int64'
+        source_columns = []
+        for sumber_data, table, columns in tables:
+            renamed = {target: col for col, target in source_rename_columns.get(sumber_data, {}).items()}
+            renamed.setdefault('TOC', 'TOC_MOD')
+            source_columns.append({
+                col: next((name for name in (col, renamed.get(col)) if name in columns), None)
+                for col in schema
+            })
+        present = [
+            col for col in schema
+            if col in additional_columns or any(mapping[col] for mapping in source_columns)
+        ]
+        selects = []
+        for (sumber_data, table, columns), mapping in zip(tables, source_columns):
+            expressions = [
+                f"{normalize_sql(sql_name(mapping[col]) if mapping[col] else 'NULL', schema[col])} AS {sql_name(col)}"
+                for col in present
+            ]
+            selects.append(f"SELECT {', '.join(expressions)} FROM {table}")
+        return " UNION ALL ".join(selects)
+
+    # Query dijalankan lewat cursor (koneksi turunan) agar aman dipakai dari beberapa thread;
+    # tables = DataFrame kecil yang didaftarkan ke cursor tersebut (mis. daftar periode)
+    def query(self, detail, sql, params, tables=None):
+        with stage('sql', detail, rows_in=self.n_rows) as record:
+            cursor = self.connection.cursor()
+            for name, table in (tables or {}).items():
+                cursor.register(name, table)
+            result = cursor.execute(sql, params).df()
+            record['rows_out'] = len(result)
+        return result
+
+    def where(self, selected_toc=(), selected_kategori_okupasi=(), selected_risiko_okupasi=(),
+              date_filter='INCEPTION DATE', date_range=()):
+        conditions = ["TRUE"]
+        params = []
+        for col, selected_values in [('TOC', selected_toc), ('Kategori Okupasi', selected_kategori_okupasi),
+                                     ('Kategori Risiko Okupasi', selected_risiko_okupasi)]:
+            if selected_values:
+                conditions.append(f'"{col}" IN ({", ".join("?" * len(selected_values))})')
+                params.extend(str(value) for value in selected_values)
+        if date_range and len(date_range) == 2:
+            conditions.append(f'"{date_filter}" BETWEEN ? AND ?')
+            params.extend(pd.Timestamp(value).to_pydatetime() for value in date_range)
+        return " AND ".join(conditions), params
+
+    # Kondisi baris klaim: NO KLAIM terisi, atau Jumlah Klaim > 0 pada fact table hasil join
+    def claim_condition(self):
+        return '"Jumlah Klaim" > 0' if 'Jumlah Klaim' in self.columns else '"NO KLAIM" IS NOT NULL'
+
+    # Top N insured untuk premi dan klaim dari satu groupby per insured
+    def top_insured(self, where, params, top_n, drill_down):
+        if drill_down:
+            where = f'{where} AND "{drill_down[0]}" = ?'
+            params = params + [str(drill_down[1])]
+        top = self.query('top_n', f"""
+            WITH per_insured AS MATERIALIZED (
+                SELECT "INSURED NAME", COALESCE(SUM("Premi Gross"), 0) AS premi,
+                       COALESCE(SUM("Paid Claim"), 0) AS klaim
+                FROM fakta WHERE {where} AND "INSURED NAME" IS NOT NULL GROUP BY 1
+            )
+            (SELECT 'Premi Gross' AS measure, "INSURED NAME", premi AS Severity
+             FROM per_insured ORDER BY premi DESC LIMIT {int(top_n)})
+            UNION ALL
+            (SELECT 'Paid Claim' AS measure, "INSURED NAME", klaim AS Severity
+             FROM per_insured ORDER BY klaim DESC LIMIT {int(top_n)})
+        """, params)
+        return [
+            top[top['measure'] == measure].sort_values('Severity', kind='stable')[["INSURED NAME", "Severity"]]
+            .reset_index(drop=True)
+            for measure in ['Premi Gross', 'Paid Claim']
+        ]
+
+    def aggregate(self, filters, top_n=10, drill_down=None):
+        where, params = self.where(**filters)
+        sums = ", ".join(f'SUM("{col}") AS "{col}"' for col in additional_columns)
+        dims = ", ".join(f'"{col}"' for col in ['UY'] + breakdown_dimensions)
+        base = self.query('UY x ' + ' x '.join(breakdown_dimensions),
+                          f"SELECT {dims}, {sums} FROM fakta WHERE {where} GROUP BY ALL", params)
+        base = base.astype({'UY': 'Int64', **{col: 'float64' for col in additional_columns}})
+        summary_uy, premi_by, klaim_by, totals, loss_ratio = roll_up(base)
+
+        premi_top, klaim_top = self.top_insured(where, params, top_n, drill_down)
+        premi_top.columns = ["Insuredname", "Severity"]
+        klaim_top.columns = ["Claimant", "Severity"]
+
+        if 'Jumlah Klaim' in self.columns:
+            # Fact table hasil join: satu baris per polis dengan jumlah klaimnya
+            claims = self.query('claims', f"""
+                SELECT COALESCE(SUM("Jumlah Klaim"), 0) AS frekuensi, SUM({incurred_sql}) AS incurred
+                FROM fakta WHERE {where}
+            """, params).iloc[0]
+            claim_frequency = int(claims['frekuensi'])
+            incurred_average = claims['incurred'] / claim_frequency if claim_frequency else np.nan
+        else:
+            claims = self.query('claims', f"""
+                SELECT COUNT(*) AS frekuensi, AVG({incurred_sql}) AS rata_rata
+                FROM fakta WHERE {where} AND "NO KLAIM" IS NOT NULL
+            """, params).iloc[0]
+            claim_frequency = int(claims['frekuensi'])
+            incurred_average = claims['rata_rata'] if claim_frequency else np.nan
+
+        return Aggregates(
+            summary_uy=summary_uy,
+            premi_by=premi_by,
+            klaim_by=klaim_by,
+            premi_top=premi_top,
+            klaim_top=klaim_top,
+            totals=totals,
+            loss_ratio=loss_ratio,
+            claim_frequency=claim_frequency,
+            incurred_average=incurred_average,
+        )
+
+    def options(self, column):
+        return self.query('options', f"""
+            SELECT DISTINCT {sql_name(column)} AS nilai FROM fakta WHERE {sql_name(column)} IS NOT NULL ORDER BY 1
+        """, [])['nilai'].tolist()
+
+    def date_bounds(self, column):
+        bounds = self.query('date_bounds', f"""
+            SELECT MIN({sql_name(column)}) AS awal, MAX({sql_name(column)}) AS akhir FROM fakta
+        """, []).iloc[0]
+        return pd.Timestamp(bounds['awal']), pd.Timestamp(bounds['akhir'])
+
+    def distinct(self, filters, column):
+        where, params = self.where(**filters)
+        return self.query('distinct', f"""
+            SELECT DISTINCT {sql_name(column)} AS nilai FROM fakta
+            WHERE {where} AND {sql_name(column)} IS NOT NULL ORDER BY 1
+        """, params)['nilai'].tolist()
+
+    def count(self, filters):
+        where, params = self.where(**filters)
+        return int(self.query('count', f"SELECT COUNT(*) AS n FROM fakta WHERE {where}", params)['n'].iloc[0])
+
+    # Satu halaman lewat LIMIT/OFFSET; rowid menjaga urutan data untuk nilai yang sama
+    def page(self, filters, sort_column=None, ascending=True, start=0, size=50):
+        where, params = self.where(**filters)
+        order = "rowid"
+        if sort_column:
+            order = f"{sql_name(sort_column)} {'ASC' if ascending else 'DESC'} NULLS LAST, rowid"
+        return self.query('page', f"""
+            SELECT * FROM fakta WHERE {where} ORDER BY {order} LIMIT {int(size)} OFFSET {int(start)}
+        """, params)
+
+    # Sama dengan DataFrame.describe() untuk kolom nominal (kuantil interpolasi linear)
+    def describe(self, filters):
+        where, params = self.where(**filters)
+        summaries = [('count', "COUNT({})"), ('mean', "AVG({})"), ('std', "STDDEV_SAMP({})"), ('min', "MIN({})"),
+                     ('25%', "quantile_cont({}, 0.25)"), ('50%', "quantile_cont({}, 0.5)"),
+                     ('75%', "quantile_cont({}, 0.75)"), ('max', "MAX({})")]
+        expressions = ", ".join(
+            f"CAST({template.format(sql_name(col))} AS DOUBLE) AS s{i}_{j}"
+            for i, col in enumerate(additional_columns) for j, (_, template) in enumerate(summaries)
+        )
+        values = self.query('describe', f"SELECT {expressions} FROM fakta WHERE {where}", params).iloc[0]
+        return pd.DataFrame(
+            values.to_numpy(dtype='float64').reshape(len(additional_columns), len(summaries)).T,
+            index=[label for label, _ in summaries], columns=additional_columns,
+        )
+
+    # Porsi earned per baris seperti earned_fraction (baris tanpa tanggal lengkap earned penuh)
+    @staticmethod
+    def earned_fraction_sql():
+        start = 'CAST("INCEPTION DATE" AS DATE)'
+        return f"""
+            CASE WHEN "INCEPTION DATE" IS NULL OR "EXPIRY DATE" IS NULL THEN 1.0
+            ELSE LEAST(GREATEST(
+                (date_diff('day', {start}, CAST(? AS DATE)) + 1) /
+                GREATEST(date_diff('day', {start}, CAST("EXPIRY DATE" AS DATE)), 1), 0.0), 1.0)
+            END
+        """
+
+    def earned_loss_ratio(self, filters, valuation_date):
+        where, params = self.where(**filters)
+        sums = ", ".join(f'COALESCE(SUM("{col}"), 0) AS "{col}"' for col in additional_columns)
+        earned = ", ".join(f'COALESCE(SUM(COALESCE("{col}", 0) * fraksi), 0) AS "earned {col}"'
+                           for col in premium_columns)
+        result = self.query('earned_loss_ratio', f"""
+            SELECT {sums}, {earned}
+            FROM (SELECT *, {self.earned_fraction_sql()} AS fraksi FROM fakta WHERE {where})
+        """, [pd.Timestamp(valuation_date).to_pydatetime()] + params).iloc[0]
+        earned_sums = pd.Series([result[f"earned {col}"] for col in premium_columns], index=premium_columns)
+        return net_incurred(result) / net_premium(earned_sums)
+
+    # Earned premium per periode seperti earned_premium_by_period: tiap polis berkontribusi
+    # tarif harian x jumlah hari yang beririsan dengan periode (range join polis x periode)
+    def earned_premium_by_period(self, filters, freq='M', valuation_date=None):
+        where, params = self.where(**filters)
+        nonzero = " OR ".join(f'COALESCE("{col}", 0) <> 0' for col in premium_columns)
+        policies = f"""
+            WITH hari_polis AS (
+                SELECT CAST("INCEPTION DATE" AS DATE) AS mulai,
+                       CAST(CASE WHEN "EXPIRY DATE" IS NULL THEN 1
+                                 ELSE GREATEST(date_diff('day', CAST("INCEPTION DATE" AS DATE),
+                                                         CAST("EXPIRY DATE" AS DATE)), 1) END AS INTEGER) AS hari,
+                       {", ".join(f'COALESCE("{col}", 0) AS p{i}' for i, col in enumerate(premium_columns))}
+                FROM fakta WHERE {where} AND "INCEPTION DATE" IS NOT NULL AND ({nonzero})
+            ), polis AS (SELECT *, mulai + hari AS selesai FROM hari_polis)
+        """
+        span = self.query('earned_span', f"{policies} SELECT MIN(mulai) AS awal, MAX(selesai) AS akhir FROM polis",
+                          params).iloc[0]
+        if pd.isna(span['awal']):
+            return pd.DataFrame(columns=['Periode'] + premium_columns)
+        origin = pd.Timestamp(span['awal'])
+        n_days = (pd.Timestamp(span['akhir']) - origin).days
+        if valuation_date is not None:
+            n_days = int(np.clip((pd.Timestamp(valuation_date).normalize() - origin).days + 1, 0, n_days))
+        if n_days == 0:
+            return pd.DataFrame(columns=['Periode'] + premium_columns)
+        horizon = origin + pd.Timedelta(days=n_days)
+        periods = pd.period_range(origin, horizon - pd.Timedelta(days=1), freq=freq)
+        period_table = pd.DataFrame({
+            'urutan': np.arange(len(periods)),
+            'awal': [max(period.start_time, origin) for period in periods],
+            'akhir': [min(period.end_time.normalize() + pd.Timedelta(days=1), horizon) for period in periods],
+        })
+        earned = ", ".join(
+            f"""COALESCE(SUM(p{i} / hari * date_diff('day', GREATEST(mulai, CAST(periode.awal AS DATE)),
+                                                   LEAST(selesai, CAST(periode.akhir AS DATE)))), 0) AS "{col}" """
+            for i, col in enumerate(premium_columns)
+        )
+        result = self.query(f'earned_premium {freq}', f"""
+            {policies}
+            SELECT periode.urutan, {earned}
+            FROM periode LEFT JOIN polis
+              ON polis.mulai < CAST(periode.akhir AS DATE) AND polis.selesai > CAST(periode.awal AS DATE)
+            GROUP BY periode.urutan ORDER BY periode.urutan
+        """, params, tables={'periode': period_table})
+        result = result[premium_columns].astype('float64')
+        result.insert(0, 'Periode', periods.astype(str))
+        return result
+
+    def earned_loss_ratio_by_year(self, filters, valuation_date=None):
+        where, params = self.where(**filters)
+        sums = ", ".join(f'COALESCE(SUM("{col}"), 0) AS "{col}"' for col in additional_columns)
+        by_year = {}
+        for year_col in ['UY', 'AY']:
+            by_year[year_col] = self.query(f'per {year_col}', f"""
+                SELECT "{year_col}" AS tahun, {sums} FROM fakta
+                WHERE {where} AND "{year_col}" IS NOT NULL GROUP BY 1 ORDER BY 1
+            """, params).astype({'tahun': 'int64'}).set_index('tahun')
+        earned = self.earned_premium_by_period(filters, 'Y', valuation_date)
+        return earned_by_year_table(earned, by_year['UY'], by_year['AY'])
+
+    # Cell triangle (UY x AY x bulan) yang lolos filter, dengan kolom seperti LossTriangle.cells
+    def triangle_cells(self, filters):
+        where, params = self.where(**filters)
+        sums = ", ".join(f'COALESCE(SUM("{col}"), 0) AS "{col}"' for col in additional_columns)
+        cells = self.query('triangle', f"""
+            SELECT "UY", "AY", date_trunc('month', "INCEPTION DATE") AS "INCEPTION MONTH",
+                   date_trunc('month', "EXPIRY DATE") AS "EXPIRY MONTH", {sums}
+            FROM fakta WHERE {where} GROUP BY ALL
+        """, params)
+        return cells.astype({'UY': 'Int64', 'AY': 'Int64'})
+
+    # Nilai severity dihitung di SQL (termasuk total per insured); hanya satu kolom nilai
+    # yang dikirim ke pandas untuk histogram
+    def severity_values(self, filters, basis):
+        where, params = self.where(**filters)
+        if basis == 'Incurred per Klaim':
+            sql = f"SELECT {incurred_sql} AS nilai FROM fakta WHERE {where} AND {self.claim_condition()}"
+        elif basis == 'Premi per Polis':
+            sql = f'SELECT "Premi Gross" AS nilai FROM fakta WHERE {where} AND "Premi Gross" IS NOT NULL'
+        else:
+            value = incurred_sql if basis == 'Incurred per Insured' else 'COALESCE("Premi Gross", 0)'
+            sql = f"""
+                SELECT SUM({value}) AS nilai FROM fakta
+                WHERE {where} AND "INSURED NAME" IS NOT NULL GROUP BY "INSURED NAME"
+            """
+        return self.query('severity', sql, params)['nilai'].to_numpy(dtype='float64')
+
+    def insured_density(self, filters, n_bins=50):
+        where, params = self.where(**filters)
+        totals = self.query('insured_totals', f"""
+            SELECT SUM(COALESCE("Premi Gross", 0)) AS premi, SUM({incurred_sql}) AS incurred FROM fakta
+            WHERE {where} AND "INSURED NAME" IS NOT NULL GROUP BY "INSURED NAME"
+        """, params)
+        return density_grid(totals['premi'].to_numpy(dtype='float64'), totals['incurred'].to_numpy(dtype='float64'),
+                            n_bins)
+
+# Batas jumlah baris mulai dipakainya DuckDB (bisa diganti lewat environment variable)
+DUCKDB_MIN_ROWS = int(os.environ.get("LR_DUCKDB_MIN_ROWS", 5_000_000))
+
+# Backend dipilih dari jumlah baris sumber, sebelum data gabungan pandas dibangun
+def use_duckdb(n_rows, min_rows=DUCKDB_MIN_ROWS):
+    return duckdb is not None and n_rows >= min_rows
+
+# Triangle loss ratio (UY x AY dan bulanan) yang dipelihara secara inkremental. Cell
+# menyimpan jumlah measure per kombinasi dimensi cube + AY. Data baru cukup di-groupby
+# lalu ditambahkan ke cell yang terdampak (cell yang belum ada ditambahkan), tanpa
+# menghitung ulang seluruh histori. Nilai kumulatif dihitung dari cell saat ditampilkan.
+triangle_dimensions = ['UY', 'AY'] + cube_dimensions[1:]
+
+class LossTriangle:
+    def __init__(self):
+        index = pd.MultiIndex.from_arrays([[]] * len(triangle_dimensions), names=triangle_dimensions)
+        self.cells = pd.DataFrame(index=index, columns=additional_columns, dtype='float64')
+
+    # Triangle baru = cell triangle ini + cell dari df. Cell triangle ini tidak diubah:
+    # objeknya bisa dipegang backend dataset lain (cache_resource) yang dipakai session lain.
+    def update(self, df):
+        with stage('triangle_update', rows_in=len(df)) as record:
+            keys = [df[col] for col in ['UY', 'AY'] + breakdown_dimensions] + month_keys(df)
+            delta = df.groupby(keys, observed=True, dropna=False)[additional_columns].sum()
+            # Label kategori disimpan sebagai nilai biasa agar cell dari dataset berbeda bisa digabung
+            delta.index = pd.MultiIndex.from_frame(
+                delta.index.to_frame(index=False).astype({col: object for col in breakdown_dimensions})
+            )
+            cells = self.cells.copy()
+            existing = delta.index.isin(cells.index)
+            if existing.any():
+                index = delta.index[existing]
+                cells.loc[index, additional_columns] = (
+                    cells.loc[index, additional_columns].to_numpy() + delta[existing].to_numpy()
+                )
+            if (~existing).any():
+                cells = pd.concat([cells, delta[~existing]]) if len(cells) else delta[~existing]
+            triangle = LossTriangle()
+            triangle.cells = cells
+            record['rows_out'] = len(delta)
+        return triangle
+
+    # Cell yang lolos filter. Rentang tanggal yang tidak sejajar bulan tidak bisa dilayani
+    # cell bulanan, sehingga triangle sementara dibangun dari data baris yang sudah difilter.
+    def select(self, filtered_df, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi,
+               date_filter, date_range):
+        if date_range and len(date_range) == 2 and not range_is_month_aligned(*date_range):
+            return LossTriangle().update(filtered_df).cells.reset_index()
+        return filter_cube(self.cells.reset_index(), selected_toc, selected_kategori_okupasi,
+                           selected_risiko_okupasi, date_filter, date_range)
+
+# Loss ratio kumulatif per UY (baris) x AY (kolom): hanya klaim yang dijumlah kumulatif
+# sepanjang AY, penyebutnya premi UY secara utuh (baris premi umumnya tanpa AY), sehingga
+# kolom terakhir tiap UY sama dengan loss ratio UY tersebut
+def development_triangle(cells):
+    claim_columns = [col for col in additional_columns if col not in premium_columns]
+    premium = cells.groupby('UY')[premium_columns].sum()
+    claims = cells.dropna(subset=['AY']).groupby(['UY', 'AY'])[claim_columns].sum()
+    cumulative = claims.groupby(level='UY').cumsum().join(premium, on='UY')
+    triangle = loss_ratio_of(cumulative).replace([np.inf, -np.inf], np.nan).unstack('AY')
+    # AY tanpa transaksi baru tetap memakai nilai kumulatif AY sebelumnya
+    triangle = triangle.ffill(axis=1)
+    triangle.columns = [str(col) for col in triangle.columns]
+    triangle.index = triangle.index.astype(str)
+    return triangle.reset_index()
+
+# Loss ratio per bulan (inception atau expiry) beserta loss ratio kumulatifnya
+def monthly_trend(cells, date_filter='INCEPTION DATE'):
+    month_col = 'INCEPTION MONTH' if date_filter == "INCEPTION DATE" else 'EXPIRY MONTH'
+    monthly = cells.groupby(month_col)[additional_columns].sum()
+    trend = pd.DataFrame({
+        'Loss Ratio': loss_ratio_of(monthly),
+        'Loss Ratio Kumulatif': loss_ratio_of(monthly.cumsum()),
+    }).replace([np.inf, -np.inf], np.nan)
+    return trend.rename_axis('Bulan').reset_index()
+
+# Earned premium: premi (beserta akuisisi, premi reas dan komisi reas) diakui pro-rata
+# harian dari INCEPTION DATE sampai EXPIRY DATE
+premium_columns = ['Premi Gross', 'Akuisisi', 'Premi Reas', 'Komisi Reas']
+
+# Tanggal mulai dan jumlah hari pertanggungan per baris; polis dengan durasi <= 0 hari
+# dianggap earned seluruhnya pada hari inception
+def coverage_days(df):
+    start = df['INCEPTION DATE'].to_numpy().astype('datetime64[D]')
+    end = df['EXPIRY DATE'].to_numpy().astype('datetime64[D]')
+    valid = ~np.isnat(start) & ~np.isnat(end)
+    days = np.where(valid, (end - start).astype('int64'), 1)
+    return start, np.maximum(days, 1), valid
+
+# Porsi premi yang sudah earned per baris pada tanggal valuasi. Baris tanpa tanggal
+# lengkap dianggap earned penuh (sama dengan basis written).
+def earned_fraction(df, valuation_date):
+    start, days, valid = coverage_days(df)
+    valuation = np.datetime64(pd.Timestamp(valuation_date).date(), 'D')
+    elapsed = (valuation - start).astype('int64') + 1
+    return np.where(valid, np.clip(elapsed / days, 0.0, 1.0), 1.0)
+
+# Loss ratio basis earned: klaim terhadap premi neto yang sudah earned pada tanggal valuasi
+def earned_loss_ratio(df, valuation_date):
+    with stage('earned_loss_ratio', rows_in=len(df)):
+        fraction = earned_fraction(df, valuation_date)
+        premi = df[premium_columns].fillna(0.0).to_numpy()
+        earned = pd.Series((premi * fraction[:, None]).sum(axis=0), index=premium_columns)
+        return net_incurred(df[additional_columns].sum()) / net_premium(earned)
+
+# Earned premium per periode akuntansi (freq 'M', 'Q' atau 'Y') tanpa loop per polis:
+# tarif harian tiap polis ditambahkan di hari inception dan dikurangkan di hari expiry
+# pada array selisih kalender (np.bincount), cumsum menghasilkan premi earned per hari,
+# lalu hari-hari dijumlah per periode dengan np.add.reduceat.
+def earned_premium_by_period(df, freq='M', valuation_date=None):
+    with stage('earned_premium', freq, rows_in=len(df)) as record:
+        premi = df[premium_columns].fillna(0.0).to_numpy()
+        start, days, _ = coverage_days(df)
+        rows = ~np.isnat(start) & (premi != 0).any(axis=1)
+        if not rows.any():
+            return pd.DataFrame(columns=['Periode'] + premium_columns)
+        start, days, premi = start[rows], days[rows], premi[rows]
+        origin = start.min()
+        first_day = (start - origin).astype('int64')
+        last_day = first_day + days
+        calendar_days = int(last_day.max()) + 1
+        n_days = calendar_days - 1
+        if valuation_date is not None:
+            valuation = np.datetime64(pd.Timestamp(valuation_date).date(), 'D')
+            n_days = int(np.clip((valuation - origin).astype('int64') + 1, 0, n_days))
+        if n_days == 0:
+            return pd.DataFrame(columns=['Periode'] + premium_columns)
+        rates = premi / days[:, None]
+        daily = np.empty((len(premium_columns), n_days))
+        for i in range(len(premium_columns)):
+            diff = (
+                np.bincount(first_day, weights=rates[:, i], minlength=calendar_days) -
+                np.bincount(last_day, weights=rates[:, i], minlength=calendar_days)
+            )
+            daily[i] = np.cumsum(diff[:n_days])
+        codes, periods = pd.factorize(pd.DatetimeIndex(origin + np.arange(n_days)).to_period(freq))
+        boundaries = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        result = pd.DataFrame(np.add.reduceat(daily, boundaries, axis=1).T, columns=premium_columns)
+        result.insert(0, 'Periode', periods.astype(str))
+        record['rows_out'] = len(result)
+        return result
+
+# Loss ratio per tahun basis earned: klaim per AY terhadap premi earned pada tahun
+# kalender yang sama, berdampingan dengan loss ratio basis written (premi per UY,
+# karena baris premi umumnya tanpa AY)
+def earned_loss_ratio_by_year(df, valuation_date=None):
+    earned = earned_premium_by_period(df, 'Y', valuation_date)
+    written = df.groupby('UY')[additional_columns].sum()
+    by_year = df.groupby('AY')[additional_columns].sum()
+    return earned_by_year_table(earned, written, by_year)
+
+# Tabel loss ratio per tahun dari earned premium tahunan, jumlah measure per UY (written)
+# dan per AY (klaim); dipakai bersama oleh kedua backend
+def earned_by_year_table(earned, written, by_year):
+    earned = earned.assign(AY=earned['Periode'].astype(int))
+    written = written.rename_axis('AY')
+    by_year = by_year.rename_axis('AY')
+    table = pd.DataFrame({
+        'Net Premi Written': net_premium(written),
+        'Net Klaim Incurred': net_incurred(by_year),
+    }).join(pd.Series(net_premium(earned.set_index('AY')), name='Net Premi Earned'), how='outer')
+    table['Loss Ratio Written'] = table['Net Klaim Incurred'] / table['Net Premi Written']
+    table['Loss Ratio Earned'] = table['Net Klaim Incurred'] / table['Net Premi Earned']
+    table = table.replace([np.inf, -np.inf], np.nan).rename_axis('AY').reset_index()
+    table['AY'] = table['AY'].astype(str)
+    return table
+
+# Distribusi severity diringkas di server: berapa pun jumlah klaim/polis/insured,
+# yang dikirim ke browser hanya n_bins batang histogram dan paling banyak
+# n_bins x n_bins cell densitas.
+severity_bases = ['Incurred per Klaim', 'Premi per Polis', 'Incurred per Insured', 'Premi per Insured']
+
+# Nilai severity per klaim, per polis atau total per insured (np.bincount atas kode kategori)
+def severity_values(df, basis):
+    if basis == 'Incurred per Klaim':
+        if 'Jumlah Klaim' in df.columns:
+            return incurred_values(df)[df['Jumlah Klaim'].to_numpy() > 0]
+        return incurred_values(df)[df["NO KLAIM"].notna().to_numpy()]
+    if basis == 'Premi per Polis':
+        return df['Premi Gross'].dropna().to_numpy()
+    values = incurred_values(df) if basis == 'Incurred per Insured' else df['Premi Gross'].fillna(0).to_numpy()
+    return insured_totals(df, values)
+
+def insured_totals(df, values):
+    codes = df["INSURED NAME"].cat.codes.to_numpy()
+    valid = codes >= 0
+    n_insured = len(df["INSURED NAME"].cat.categories)
+    present = np.bincount(codes[valid], minlength=n_insured) > 0
+    return np.bincount(codes[valid], weights=values[valid], minlength=n_insured)[present]
+
+# Tepi bin logaritmik untuk nilai positif
+def log_edges(values, n_bins):
+    low, high = np.log10(values.min()), np.log10(values.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    edges = np.logspace(low, high, n_bins + 1)
+    # Tepi luar disamakan persis dengan min/max agar tidak ada nilai yang jatuh karena pembulatan
+    edges[0], edges[-1] = min(edges[0], values.min()), max(edges[-1], values.max())
+    return edges
+
+# Histogram log (jumlah dan total nilai per bin) serta kuantil; nilai <= 0 tidak bisa
+# digambar pada skala log dan hanya dihitung jumlahnya
+def severity_histogram(values, n_bins=60, quantiles=(0.5, 0.9, 0.99)):
+    with stage('severity_histogram', rows_in=len(values)) as record:
+        values = values[np.isfinite(values)]
+        positive = values[values > 0]
+        if not len(positive):
+            return pd.DataFrame(columns=['Batas Bawah', 'Batas Atas', 'Jumlah', 'Total']), pd.Series(dtype='float64'), len(values)
+        edges = log_edges(positive, n_bins)
+        counts, _ = np.histogram(positive, edges)
+        totals, _ = np.histogram(positive, edges, weights=positive)
+        histogram = pd.DataFrame({'Batas Bawah': edges[:-1], 'Batas Atas': edges[1:], 'Jumlah': counts, 'Total': totals})
+        quantile_values = pd.Series(np.quantile(values, quantiles), index=[f"p{q * 100:g}" for q in quantiles])
+        record['rows_out'] = len(histogram)
+        return histogram, quantile_values, int((values <= 0).sum())
+
+# Densitas 2 dimensi premi vs incurred per insured pada grid log; hanya cell berisi
+def insured_density(df, n_bins=50):
+    with stage('insured_density', rows_in=len(df)) as record:
+        premi = insured_totals(df, df['Premi Gross'].fillna(0).to_numpy())
+        incurred = insured_totals(df, incurred_values(df))
+        density = density_grid(premi, incurred, n_bins)
+        record['rows_out'] = len(density)
+        return density
+
+# Grid log premi x incurred dari total per insured
+def density_grid(premi, incurred, n_bins=50):
+    with stage('density_grid', rows_in=len(premi)) as record:
+        positive = (premi > 0) & (incurred > 0)
+        premi, incurred = premi[positive], incurred[positive]
+        if not len(premi):
+            return pd.DataFrame(columns=['Premi', 'Incurred', 'Jumlah Insured'])
+        x_edges, y_edges = log_edges(premi, n_bins), log_edges(incurred, n_bins)
+        counts, _, _ = np.histogram2d(premi, incurred, bins=[x_edges, y_edges])
+        x_index, y_index = np.nonzero(counts)
+        density = pd.DataFrame({
+            'Premi': np.sqrt(x_edges[x_index] * x_edges[x_index + 1]),
+            'Incurred': np.sqrt(y_edges[y_index] * y_edges[y_index + 1]),
+            'Jumlah Insured': counts[x_index, y_index].astype('int64'),
+        })
+        record['rows_out'] = len(density)
+        return density
+
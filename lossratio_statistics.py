@@ -0,0 +1,163 @@
+# Statistik severity dan frekuensi klaim per TOC, Kategori Okupasi dan Kategori
+# Risiko Okupasi. Semua kelompok satu dimensi dihitung dalam satu lintasan vektor:
+# jumlah dan total lewat np.bincount, kuantil lewat satu np.lexsort (kelompok,
+# severity) lalu indeks posisi per segmen, tanpa groupby per kelompok.
+import numpy as np
+import pandas as pd
+
+import lossratio_engine as engine
+
+statistic_dimensions = ['TOC', 'Kategori Okupasi', 'Kategori Risiko Okupasi']
+
+# Batas large loss bawaan (IDR)
+LARGE_LOSS_THRESHOLDS = (100_000_000, 1_000_000_000)
+
+def large_loss_column(threshold):
+    return f"Klaim > {engine.simplify_numbers([threshold])[0]}"
+
+# Kuantil per segmen data terurut (interpolasi linear seperti np.quantile)
+def segment_quantile(sorted_values, offsets, sizes, q):
+    if not len(sorted_values):
+        return np.full(len(sizes), np.nan)
+    position = q * np.maximum(sizes - 1, 0)
+    lower = np.floor(position).astype('int64')
+    upper = np.ceil(position).astype('int64')
+    low_values = sorted_values[np.minimum(offsets + lower, len(sorted_values) - 1)]
+    high_values = sorted_values[np.minimum(offsets + upper, len(sorted_values) - 1)]
+    return np.where(sizes > 0, low_values + (high_values - low_values) * (position - lower), np.nan)
+
+# Statistik untuk satu pembagian kelompok; codes = kode kelompok per baris (-1 = kosong)
+def group_statistics(codes, n_groups, severity, is_claim, claim_weight, incurred_rows, policy_codes, thresholds):
+    valid = codes >= 0
+    policy_rows = valid & (policy_codes >= 0)
+    n_policy_codes = int(policy_codes.max()) + 1 if len(policy_codes) else 1
+    pairs = np.unique(codes[policy_rows].astype('int64') * n_policy_codes + policy_codes[policy_rows])
+    n_policies = np.bincount(pairs // n_policy_codes, minlength=n_groups)
+
+    claim_rows = valid & is_claim
+    groups = codes[claim_rows]
+    values = severity[claim_rows]
+    n_claims = np.bincount(groups, weights=claim_weight[claim_rows], minlength=n_groups)
+    total = np.bincount(codes[valid & incurred_rows], weights=severity[valid & incurred_rows], minlength=n_groups)
+
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    sizes = np.bincount(groups, minlength=n_groups)
+    offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = {
+            'Jumlah Polis': n_policies,
+            'Jumlah Klaim': n_claims.astype('int64'),
+            'Frekuensi Klaim': np.where(n_policies > 0, n_claims / n_policies, np.nan),
+            'Rata-rata Severity': np.where(n_claims > 0, total / n_claims, np.nan),
+            'Median Severity': segment_quantile(sorted_values, offsets, sizes, 0.5),
+            'P90 Severity': segment_quantile(sorted_values, offsets, sizes, 0.9),
+            'P99 Severity': segment_quantile(sorted_values, offsets, sizes, 0.99),
+            'Severity Maks': segment_quantile(sorted_values, offsets, sizes, 1.0),
+        }
+    for threshold in thresholds:
+        table[large_loss_column(threshold)] = np.bincount(groups, weights=values > threshold,
+                                                          minlength=n_groups).astype('int64')
+    return pd.DataFrame(table)
+
+# Tabel statistik klaim: baris "Semua" lalu satu baris per nilai setiap dimensi.
+# Data bertumpuk: satu baris klaim = satu klaim, polis dihitung dari NO POLIS unik
+# baris premi. Fact table hasil join: Jumlah Klaim per polis, severity per polis
+# berklaim, dan rata-rata = total incurred / jumlah klaim (sama dengan kartu ringkasan).
+def claim_statistics(df, thresholds=LARGE_LOSS_THRESHOLDS, dimensions=statistic_dimensions):
+    with engine.stage('claim_statistics', rows_in=len(df)) as record:
+        severity = engine.incurred_values(df)
+        if 'Jumlah Klaim' in df.columns:
+            claim_weight = df['Jumlah Klaim'].fillna(0).to_numpy(dtype='float64')
+            is_claim = claim_weight > 0
+            incurred_rows = np.ones(len(df), dtype=bool)
+        else:
+            is_claim = df['NO KLAIM'].notna().to_numpy()
+            claim_weight = is_claim.astype('float64')
+            incurred_rows = is_claim
+        policy_codes = pd.factorize(df['NO POLIS'])[0]
+        policy_codes[df['Premi Gross'].isna().to_numpy()] = -1
+
+        tables = []
+        for dim in [None] + list(dimensions):
+            if dim is None:
+                codes, uniques = np.zeros(len(df), dtype='int64'), pd.Index(['Semua'])
+            else:
+                codes, uniques = pd.factorize(df[dim], sort=True)
+            table = group_statistics(codes, len(uniques), severity, is_claim, claim_weight, incurred_rows,
+                                     policy_codes, thresholds)
+            table.insert(0, 'Nilai', pd.Index(uniques).astype(str))
+            table.insert(0, 'Dimensi', dim or 'Semua')
+            tables.append(table)
+        result = pd.concat(tables, ignore_index=True)
+        record['rows_out'] = len(result)
+        return result
+
+# Statistik klaim yang sama dihitung DuckDB dengan satu query GROUPING SETS ("Semua" dan
+# setiap dimensi), kuantil lewat quantile_cont (interpolasi linear seperti np.quantile)
+def claim_statistics_sql(backend, filters, thresholds=LARGE_LOSS_THRESHOLDS, dimensions=statistic_dimensions):
+    where, params = backend.where(**filters)
+    if 'Jumlah Klaim' in backend.columns:
+        claim_weight, incurred_row = 'COALESCE("Jumlah Klaim", 0)', 'TRUE'
+    else:
+        claim_weight, incurred_row = 'CASE WHEN "NO KLAIM" IS NOT NULL THEN 1 ELSE 0 END', '"NO KLAIM" IS NOT NULL'
+    columns = [engine.sql_name(dim) for dim in dimensions]
+    large_losses = ", ".join(
+        f"COUNT(*) FILTER (WHERE bobot > 0 AND severity > {float(threshold)!r}) AS large_{i}"
+        for i, threshold in enumerate(thresholds)
+    )
+    result = backend.query('claim_statistics', f"""
+        WITH klaim AS (
+            SELECT {", ".join(columns)}, "NO POLIS", "Premi Gross", {engine.incurred_sql} AS severity,
+                   {claim_weight} AS bobot, {incurred_row} AS baris_incurred
+            FROM fakta WHERE {where}
+        )
+        SELECT {", ".join(f"GROUPING({col}) AS g{i}" for i, col in enumerate(columns))}, {", ".join(columns)},
+               COUNT(DISTINCT "NO POLIS") FILTER (WHERE "Premi Gross" IS NOT NULL) AS n_policies,
+               COALESCE(SUM(bobot) FILTER (WHERE bobot > 0), 0) AS n_claims,
+               COALESCE(SUM(severity) FILTER (WHERE baris_incurred), 0) AS total,
+               quantile_cont(severity, 0.5) FILTER (WHERE bobot > 0) AS q50,
+               quantile_cont(severity, 0.9) FILTER (WHERE bobot > 0) AS q90,
+               quantile_cont(severity, 0.99) FILTER (WHERE bobot > 0) AS q99,
+               MAX(severity) FILTER (WHERE bobot > 0) AS maks
+               {", " + large_losses if large_losses else ""}
+        FROM klaim
+        GROUP BY GROUPING SETS ((), {", ".join(f"({col})" for col in columns)})
+    """, params)
+
+    tables = []
+    for position, dim in enumerate([None] + list(dimensions)):
+        if dim is None:
+            rows = result[result[[f"g{i}" for i in range(len(columns))]].eq(1).all(axis=1)]
+            labels = pd.Series(['Semua'] * len(rows), index=rows.index)
+        else:
+            rows = result[(result[f"g{position - 1}"] == 0) & result[dim].notna()]
+            rows = rows.sort_values(dim, kind='stable')
+            labels = rows[dim].astype(str)
+        n_policies = rows['n_policies'].to_numpy(dtype='int64')
+        n_claims = rows['n_claims'].to_numpy(dtype='float64')
+        total = rows['total'].to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table = pd.DataFrame({
+                'Dimensi': dim or 'Semua',
+                'Nilai': labels.to_numpy(),
+                'Jumlah Polis': n_policies,
+                'Jumlah Klaim': n_claims.astype('int64'),
+                'Frekuensi Klaim': np.where(n_policies > 0, n_claims / n_policies, np.nan),
+                'Rata-rata Severity': np.where(n_claims > 0, total / n_claims, np.nan),
+                'Median Severity': rows['q50'].to_numpy(dtype='float64'),
+                'P90 Severity': rows['q90'].to_numpy(dtype='float64'),
+                'P99 Severity': rows['q99'].to_numpy(dtype='float64'),
+                'Severity Maks': rows['maks'].to_numpy(dtype='float64'),
+            })
+        for i, threshold in enumerate(thresholds):
+            table[large_loss_column(threshold)] = rows[f"large_{i}"].to_numpy(dtype='int64')
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+# Statistik klaim untuk satu kombinasi filter lewat backend agregasi dataset
+def backend_claim_statistics(backend, filters, thresholds=LARGE_LOSS_THRESHOLDS, dimensions=statistic_dimensions):
+    if isinstance(backend, engine.DuckDBBackend):
+        return claim_statistics_sql(backend, filters, thresholds, dimensions)
+    return claim_statistics(backend.rows(filters)[0], thresholds, dimensions)
@@ -0,0 +1,144 @@
+# Generator data sintetis Premi / Klaim / OS Klaim dengan nama kolom yang sama seperti
+# file upload asli, untuk uji skala dan benchmark (lihat lossratio_benchmark.py).
+# Contoh:
+#   python lossratio_synthetic.py --rows 10000 100000 --format xlsx --output-dir data_sintetis
+#   python lossratio_synthetic.py --rows 1000000 10000000 --format parquet
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Excel (xlsx) dibatasi 1.048.576 baris per sheet termasuk header
+EXCEL_MAX_ROWS = 1_048_575
+
+toc_values = ['FIRE', 'EQ', 'PAR', 'IAR']
+toc_weights = [0.45, 0.15, 0.25, 0.15]
+kategori_okupasi_values = ['Residensial', 'Komersial', 'Industrial']
+kategori_okupasi_weights = [0.5, 0.3, 0.2]
+risiko_okupasi_values = ['A', 'B', 'C', 'D']
+risiko_okupasi_weights = [0.2, 0.35, 0.3, 0.15]
+
+# Porsi baris klaim dan OS klaim terhadap jumlah polis, serta baris duplikat
+# (kunci sama) yang harus dibuang oleh deduplikasi
+CLAIM_RATE = 0.2
+OS_CLAIM_RATE = 0.1
+DUPLICATE_RATE = 0.02
+
+def format_ids(prefix, ids, width):
+    return pd.Series(np.char.add(prefix, np.char.zfill(ids.astype(str), width)))
+
+def generate_premi(n_rows, rng, start_year=2019, n_years=6):
+    n_insured = max(1, n_rows // 4)
+    uy = rng.integers(start_year, start_year + n_years, n_rows)
+    inception = (
+        pd.to_datetime(uy.astype(str), format="%Y").to_numpy() +
+        rng.integers(0, 365, n_rows).astype('timedelta64[D]')
+    )
+    tenor = rng.choice([180, 365, 365, 365, 730], n_rows).astype('timedelta64[D]')
+    premi = rng.lognormal(16, 1.2, n_rows).round(2)
+    return pd.DataFrame({
+        'AY': uy,
+        'UY': uy,
+        'TOC_MOD': pd.Categorical.from_codes(rng.choice(4, n_rows, p=toc_weights), toc_values),
+        'Kategori Okupasi': pd.Categorical.from_codes(
+            rng.choice(3, n_rows, p=kategori_okupasi_weights), kategori_okupasi_values),
+        'Kategori Risiko Okupasi': pd.Categorical.from_codes(
+            rng.choice(4, n_rows, p=risiko_okupasi_weights), risiko_okupasi_values),
+        'INSURED NAME': format_ids("PT INSURED ", rng.integers(0, n_insured, n_rows), 8),
+        'NO POLIS': format_ids("POL", np.arange(n_rows), 9),
+        'NO SERTIFIKAT': rng.integers(1, 100, n_rows),
+        'INCEPTION DATE': inception,
+        'EXPIRY DATE': inception + tenor,
+        'PREMI IDR': premi,
+        'AKUISISI': (premi * rng.uniform(0.1, 0.25, n_rows)).round(2),
+        'PREMI REAS IDR': (premi * rng.uniform(0.2, 0.5, n_rows)).round(2),
+        'KOMISI REAS IDR': (premi * rng.uniform(0.02, 0.08, n_rows)).round(2),
+    })
+
+# Klaim dan OS klaim mengacu ke polis di data premi sehingga join per polis menemukan pasangannya
+def generate_claims(premi, rate, rng, prefix):
+    n_rows = max(1, int(len(premi) * rate))
+    policies = premi.iloc[rng.integers(0, len(premi), n_rows)].reset_index(drop=True)
+    accident_year = np.minimum(policies['UY'].to_numpy() + rng.integers(0, 3, n_rows), policies['UY'].max() + 2)
+    claims = policies[[
+        'UY', 'TOC_MOD', 'Kategori Okupasi', 'Kategori Risiko Okupasi', 'INSURED NAME',
+        'NO POLIS', 'NO SERTIFIKAT', 'INCEPTION DATE', 'EXPIRY DATE',
+    ]].copy()
+    claims.insert(0, 'AY', accident_year)
+    claims['NO KLAIM'] = format_ids(prefix, np.arange(n_rows), 9)
+    amount = (policies['PREMI IDR'].to_numpy() * rng.lognormal(0.5, 1.0, n_rows)).round(2)
+    return claims, amount, rng.uniform(0.2, 0.5, n_rows)
+
+def generate_klaim(premi, rng):
+    klaim, amount, reas_share = generate_claims(premi, CLAIM_RATE, rng, "KLM")
+    klaim['CLAIM AMOUNT (IDR)'] = amount
+    klaim['KLAIM REAS'] = (amount * reas_share).round(2)
+    return klaim
+
+def generate_os_klaim(premi, rng):
+    os_klaim, amount, reas_share = generate_claims(premi, OS_CLAIM_RATE, rng, "OSK")
+    os_klaim['Gross OS Klaim'] = amount
+    os_klaim['Reas'] = (amount * reas_share).round(2)
+    return os_klaim
+
+# Tambahkan salinan sebagian baris (kunci dan isi sama) untuk menguji deduplikasi
+def add_duplicates(df, rng, rate=DUPLICATE_RATE):
+    n_duplicates = int(len(df) * rate)
+    if n_duplicates == 0:
+        return df
+    duplicates = df.iloc[rng.integers(0, len(df), n_duplicates)]
+    return pd.concat([df, duplicates], ignore_index=True)
+
+# Ketiga sumber data sintetis untuk n_rows polis
+def generate_dataset(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    premi = generate_premi(n_rows, rng)
+    klaim = generate_klaim(premi, rng)
+    os_klaim = generate_os_klaim(premi, rng)
+    return {
+        'Premi': add_duplicates(premi, rng),
+        'Klaim': add_duplicates(klaim, rng),
+        'OS Klaim': add_duplicates(os_klaim, rng),
+    }
+
+def dataset_paths(output_dir, n_rows, output_format):
+    return {
+        sumber_data: os.path.join(output_dir, f"{sumber_data.lower().replace(' ', '_')}_{n_rows}.{output_format}")
+        for sumber_data in ['Premi', 'Klaim', 'OS Klaim']
+    }
+
+def write_dataset(dataset, paths, output_format):
+    for sumber_data, df in dataset.items():
+        if output_format == 'xlsx':
+            if len(df) > EXCEL_MAX_ROWS:
+                raise ValueError(f"{sumber_data}: {len(df):,} baris melebihi batas Excel ({EXCEL_MAX_ROWS:,}); "
+                                 "gunakan --format parquet")
+            df.to_excel(paths[sumber_data], index=False)
+        else:
+            df.to_parquet(paths[sumber_data], index=False)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generator data sintetis Premi / Klaim / OS Klaim")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000],
+                        help="Jumlah polis (baris premi) per dataset, mis. 10000 1000000 10000000")
+    parser.add_argument('--format', choices=['xlsx', 'parquet'], default='xlsx')
+    parser.add_argument('--output-dir', default='data_sintetis')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for n_rows in args.rows:
+        dataset = generate_dataset(n_rows, args.seed)
+        paths = dataset_paths(args.output_dir, n_rows, args.format)
+        try:
+            write_dataset(dataset, paths, args.format)
+        except ValueError as error:
+            raise SystemExit(str(error))
+        for sumber_data, path in paths.items():
+            print(f"{path}: {len(dataset[sumber_data]):,} baris")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# Fixture bersama: data sintetis kecil (lossratio_synthetic) yang sudah melewati
+# read_source (drop kolom Unnamed + deduplikasi) dan combine_sources, seperti di dashboard.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lossratio_engine as engine  # noqa: E402
+import lossratio_synthetic as synthetic  # noqa: E402
+
+key_columns = {
+    'Premi': engine.key_columns_premi,
+    'Klaim': engine.key_columns_klaim,
+    'OS Klaim': engine.key_columns_osklaim,
+}
+
+@pytest.fixture(scope='session')
+def raw_sources():
+    return synthetic.generate_dataset(2_000, seed=7)
+
+@pytest.fixture(scope='session')
+def sources(raw_sources):
+    return {
+        sumber_data: engine.read_source(None, sumber_data, key_columns[sumber_data], parsed_df=df.copy())
+        for sumber_data, df in raw_sources.items()
+    }
+
+@pytest.fixture(scope='session')
+def combined(sources):
+    return engine.combine_sources(sources['Premi'], sources['Klaim'], sources['OS Klaim'])
@@ -0,0 +1,302 @@
+# Hasil engine dibandingkan dengan perhitungan pandas/numpy biasa (mask boolean, groupby,
+# np.quantile, earned premium per hari) pada data sintetis lossratio_synthetic.
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import lossratio_engine as engine
+import lossratio_statistics as statistics
+
+filter_sets = {
+    'kategori': dict(selected_toc=['FIRE', 'PAR'], selected_kategori_okupasi=[], selected_risiko_okupasi=['B'],
+                     date_filter='INCEPTION DATE', date_range=()),
+    'tanggal sejajar bulan': dict(selected_toc=[], selected_kategori_okupasi=['Komersial'], selected_risiko_okupasi=[],
+                                  date_filter='EXPIRY DATE',
+                                  date_range=(datetime.date(2021, 3, 1), datetime.date(2022, 8, 31))),
+    'tanggal tidak sejajar': dict(selected_toc=[], selected_kategori_okupasi=[], selected_risiko_okupasi=[],
+                                  date_filter='INCEPTION DATE',
+                                  date_range=(datetime.date(2020, 2, 10), datetime.date(2021, 11, 20))),
+    'tanpa filter': dict(selected_toc=[], selected_kategori_okupasi=[], selected_risiko_okupasi=[],
+                         date_filter='INCEPTION DATE', date_range=()),
+}
+
+claim_columns = [col for col in engine.additional_columns if col not in engine.premium_columns]
+
+# Filter acuan: mask boolean biasa per kolom
+def reference_mask(df, selected_toc, selected_kategori_okupasi, selected_risiko_okupasi, date_filter, date_range):
+    mask = pd.Series(True, index=df.index)
+    for col, selected_values in [('TOC', selected_toc), ('Kategori Okupasi', selected_kategori_okupasi),
+                                 ('Kategori Risiko Okupasi', selected_risiko_okupasi)]:
+        if selected_values:
+            mask &= df[col].isin(selected_values)
+    if date_range:
+        start_date, end_date = date_range
+        mask &= (df[date_filter] >= pd.Timestamp(start_date)) & (df[date_filter] <= pd.Timestamp(end_date))
+    return mask.to_numpy()
+
+@pytest.fixture(scope='module')
+def pandas_backend(combined):
+    return engine.PandasBackend(combined, engine.build_cube(combined), engine.FilterIndex(combined))
+
+@pytest.mark.parametrize('name', filter_sets)
+def test_select_rows_matches_boolean_mask(combined, pandas_backend, name):
+    filters = filter_sets[name]
+    filtered_df, agg_df = engine.select_rows(combined, pandas_backend.cube, pandas_backend.filter_index, **filters)
+    expected = combined[reference_mask(combined, **filters)]
+    pd.testing.assert_frame_equal(filtered_df, expected)
+
+    # Cube yang difilter (tanggal sejajar bulan / tanpa tanggal) berisi total yang sama
+    np.testing.assert_allclose(agg_df[engine.additional_columns].sum(), expected[engine.additional_columns].sum())
+    if agg_df is not filtered_df:
+        assert agg_df['Jumlah Baris'].sum() == len(expected)
+
+@pytest.mark.parametrize('name', filter_sets)
+def test_cube_roll_up_matches_groupby(combined, pandas_backend, name):
+    filters = filter_sets[name]
+    aggregates = pandas_backend.aggregate(filters, top_n=5)
+    expected = combined[reference_mask(combined, **filters)]
+
+    summary_uy = aggregates.summary_uy.set_index('UY')[engine.additional_columns]
+    expected_uy = expected.groupby('UY')[engine.additional_columns].sum()
+    np.testing.assert_allclose(summary_uy.loc[expected_uy.index], expected_uy)
+    for dim in engine.breakdown_dimensions:
+        premi_by = aggregates.premi_by[dim].set_index(dim)['Premi Gross']
+        expected_by = expected.groupby(dim, observed=True)['Premi Gross'].sum()
+        np.testing.assert_allclose(premi_by.loc[expected_by.index], expected_by)
+
+    totals = expected[engine.additional_columns].sum()
+    np.testing.assert_allclose(aggregates.totals[engine.additional_columns], totals)
+    assert aggregates.loss_ratio == pytest.approx(engine.loss_ratio_of(totals))
+    assert aggregates.claim_frequency == expected['NO KLAIM'].notna().sum()
+
+    top = expected.groupby('INSURED NAME', observed=True)['Premi Gross'].sum().nlargest(5)
+    premi_top = aggregates.premi_top.set_index('Insuredname')['Severity']
+    assert set(premi_top.index) == set(top.index)
+    np.testing.assert_allclose(premi_top.loc[top.index], top)
+
+def test_segment_quantile_matches_np_quantile():
+    rng = np.random.default_rng(0)
+    sizes = np.array([0, 1, 2, 7, 50])
+    groups = [rng.lognormal(10, 2, size) for size in sizes]
+    sorted_values = np.concatenate([np.sort(values) for values in groups])
+    offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+    for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+        result = statistics.segment_quantile(sorted_values, offsets, sizes, q)
+        expected = [np.quantile(values, q) if len(values) else np.nan for values in groups]
+        np.testing.assert_allclose(result, expected)
+
+def test_claim_statistics_matches_pandas(combined):
+    result = statistics.claim_statistics(combined).set_index(['Dimensi', 'Nilai'])
+    claims = combined[combined['NO KLAIM'].notna()].assign(Severity=lambda df: engine.incurred_values(df))
+    policies = combined[combined['Premi Gross'].notna()]
+    for dim in [None] + statistics.statistic_dimensions:
+        by = claims[dim] if dim else pd.Series('Semua', index=claims.index)
+        policy_by = policies[dim] if dim else pd.Series('Semua', index=policies.index)
+        severity = claims.groupby(by.astype(str))['Severity']
+        expected = pd.DataFrame({
+            'Jumlah Polis': policies.groupby(policy_by.astype(str))['NO POLIS'].nunique(),
+            'Jumlah Klaim': severity.size(),
+            'Rata-rata Severity': severity.mean(),
+            'Median Severity': severity.quantile(0.5),
+            'P90 Severity': severity.quantile(0.9),
+            'P99 Severity': severity.quantile(0.99),
+            'Severity Maks': severity.max(),
+            **{statistics.large_loss_column(threshold): (claims['Severity'] > threshold).groupby(by.astype(str)).sum()
+               for threshold in statistics.LARGE_LOSS_THRESHOLDS},
+        })
+        table = result.loc[dim or 'Semua']
+        np.testing.assert_allclose(table.loc[expected.index, expected.columns].astype('float64'), expected)
+
+# Earned premium acuan: setiap polis dipecah per hari pertanggungan (tarif harian = premi / hari)
+def daily_earned(df, valuation_date):
+    premi = df[engine.premium_columns].fillna(0.0)
+    rows = df['INCEPTION DATE'].notna().to_numpy() & (premi != 0).any(axis=1).to_numpy()
+    start, days, _ = engine.coverage_days(df[rows])
+    day = np.repeat(start, days) + (np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days))
+    rates = np.repeat(premi[rows].to_numpy() / days[:, None], days, axis=0)
+    daily = pd.DataFrame(rates, columns=engine.premium_columns, index=pd.DatetimeIndex(day))
+    return daily[daily.index <= pd.Timestamp(valuation_date)]
+
+def test_earned_premium_matches_daily_brute_force(combined):
+    valuation_date = datetime.date(2022, 6, 15)
+    daily = daily_earned(combined, valuation_date)
+    for freq in ('M', 'Q', 'Y'):
+        result = engine.earned_premium_by_period(combined, freq, valuation_date).set_index('Periode')
+        expected = daily.groupby(daily.index.to_period(freq))[engine.premium_columns].sum()
+        expected.index = expected.index.astype(str)
+        expected = expected.reindex(result.index, fill_value=0.0)
+        np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-3)
+
+    # Polis tanpa premi (baris klaim) tidak ikut; total earned sama dengan loss ratio basis earned
+    earned = pd.Series(daily.sum(), index=engine.premium_columns)
+    expected_ratio = engine.net_incurred(combined[engine.additional_columns].sum()) / engine.net_premium(earned)
+    assert engine.earned_loss_ratio(combined, valuation_date) == pytest.approx(expected_ratio)
+
+def test_incremental_dedup_with_dtype_drift(sources, monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, 'INCREMENTAL_DIR', str(tmp_path))
+    premi = sources['Premi'].reset_index(drop=True)
+    key_columns = engine.key_columns_premi
+
+    first = premi.iloc[:1200]
+    assert engine.append_incremental('Premi', 'upload_1', first, key_columns) == {
+        'new': 1200, 'changed': 0, 'duplicate': 0
+    }
+    # Tipe hasil parse berbeda (angka -> float, teks -> kategori) tidak membuat baris lama dianggap baru
+    second = premi.iloc[800:].astype({'NO SERTIFIKAT': 'float64', 'INSURED NAME': 'category'})
+    assert engine.append_incremental('Premi', 'upload_2', second, key_columns) == {
+        'new': len(premi) - 1200, 'changed': 0, 'duplicate': 400
+    }
+    third = premi.iloc[:10].copy()
+    third.loc[0, 'PREMI IDR'] += 1
+    assert engine.append_incremental('Premi', 'upload_3', third, key_columns) == {
+        'new': 0, 'changed': 1, 'duplicate': 9
+    }
+    # File yang sama tidak digabung dua kali
+    assert engine.append_incremental('Premi', 'upload_1', first, key_columns)['new'] == 1200
+    assert len(engine.load_incremental_manifest('Premi')['parts']) == 3
+
+    # Sama dengan drop_duplicates(keep='first') atas seluruh upload
+    stored = engine.read_incremental(engine.incremental_part_files('Premi'))
+    expected = pd.concat([first, second.astype(first.dtypes.to_dict()), third], ignore_index=True)
+    expected = expected.drop_duplicates(subset=key_columns, keep='first')
+    assert sorted(stored['NO POLIS']) == sorted(expected['NO POLIS'])
+    assert stored['Premi Gross'].sum() == pytest.approx(expected['PREMI IDR'].sum())
+
+def test_concurrent_publish_gets_separate_versions(sources, monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, 'DATASET_DIR', str(tmp_path))
+
+    def publish(n_rows):
+        return engine.publish_dataset("Closing 2026-09", {
+            sumber_data: df.head(n_rows) for sumber_data, df in sources.items()
+        })
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        paths = list(pool.map(publish, range(10, 18)))
+    assert len(set(paths)) == 8
+    datasets = engine.list_datasets()
+    assert sorted(manifest['version'] for manifest in datasets) == list(range(1, 9))
+    # Setiap versi hanya berisi file dari satu penyimpanan
+    for manifest in datasets:
+        stored = engine.read_dataset(manifest['path'])
+        assert {sumber_data: len(df) for sumber_data, df in stored.items()} == manifest['rows']
+        assert len(set(manifest['rows'].values())) == 1
+
+def test_policy_join_matches_stacked_totals(combined, pandas_backend):
+    fact, match_rates = engine.build_policy_fact(combined)
+    assert not fact.duplicated(['NO POLIS', 'NO SERTIFIKAT', 'AY']).any()
+    assert match_rates == {'Klaim': pytest.approx(1.0), 'OS Klaim': pytest.approx(1.0)}
+
+    np.testing.assert_allclose(fact[engine.additional_columns].sum(),
+                               combined[engine.additional_columns].sum())
+    assert fact['Jumlah Klaim'].sum() == combined['NO KLAIM'].notna().sum()
+    # Premi tetap per UY dan klaim tetap per AY-nya sendiri
+    premi = combined[combined['Sumber Data'] == 'Premi']
+    np.testing.assert_allclose(fact.groupby('UY')[engine.premium_columns].sum(),
+                               premi.groupby('UY')[engine.premium_columns].sum())
+    fact_claims = fact.groupby('AY')[claim_columns].sum()
+    np.testing.assert_allclose(fact_claims, combined.groupby('AY')[claim_columns].sum().loc[fact_claims.index])
+
+    joined = engine.PandasBackend(fact, engine.build_cube(fact), engine.FilterIndex(fact))
+    filters = filter_sets['kategori']
+    aggregates = joined.aggregate(filters)
+    stacked = pandas_backend.aggregate(filters)
+    assert aggregates.loss_ratio == pytest.approx(stacked.loss_ratio)
+    assert aggregates.claim_frequency == stacked.claim_frequency
+    assert aggregates.incurred_average == pytest.approx(stacked.incurred_average)
+
+def test_policy_join_refuses_missing_policy_numbers(combined):
+    df = combined.copy()
+    df.loc[df['Sumber Data'] == 'Klaim', 'NO POLIS'] = pd.NA
+    with pytest.raises(ValueError, match="NO POLIS"):
+        engine.build_policy_fact(df)
+
+def test_development_triangle_without_premium_ay(combined):
+    df = combined.copy()
+    df.loc[df['Sumber Data'] == 'Premi', 'AY'] = pd.NA
+    cells = engine.LossTriangle().update(df).cells.reset_index()
+    triangle = engine.development_triangle(cells).set_index('UY')
+    # Kolom AY terakhir = loss ratio seluruh UY (premi UY utuh, klaim kumulatif)
+    expected = engine.loss_ratio_of(df.groupby('UY')[engine.additional_columns].sum())
+    expected.index = expected.index.astype(str)
+    np.testing.assert_allclose(triangle.iloc[:, -1], expected.loc[triangle.index])
+
+def test_incremental_triangle_leaves_previous_backend_unchanged(combined):
+    previous_df = combined.iloc[:len(combined) // 2]
+    previous = engine.PandasBackend(previous_df, engine.build_cube(previous_df), engine.FilterIndex(previous_df),
+                                    engine.LossTriangle().update(previous_df))
+    filters = filter_sets['tanpa filter']
+    before = previous.triangle_cells(filters)[engine.additional_columns].sum()
+
+    triangle = previous.triangle.update(combined.iloc[len(combined) // 2:])
+    np.testing.assert_allclose(previous.triangle_cells(filters)[engine.additional_columns].sum(), before)
+    np.testing.assert_allclose(before, previous_df[engine.additional_columns].sum())
+    # Triangle hasil penambahan sama dengan triangle yang dibangun dari seluruh data
+    expected = engine.LossTriangle().update(combined).cells
+    np.testing.assert_allclose(triangle.cells.loc[expected.index], expected)
+    assert len(triangle.cells) == len(expected)
+
+@pytest.mark.parametrize('name', filter_sets)
+def test_duckdb_backend_matches_pandas(sources, combined, pandas_backend, name):
+    pytest.importorskip('duckdb')
+    backend = engine.DuckDBBackend(sources)
+    filters = filter_sets[name]
+    valuation_date = datetime.date(2022, 6, 15)
+
+    assert backend.count(filters) == pandas_backend.count(filters)
+    aggregates, expected = backend.aggregate(filters), pandas_backend.aggregate(filters)
+    np.testing.assert_allclose(aggregates.totals[engine.additional_columns],
+                               expected.totals[engine.additional_columns])
+    assert aggregates.claim_frequency == expected.claim_frequency
+    np.testing.assert_allclose(backend.describe(filters), pandas_backend.describe(filters))
+    np.testing.assert_allclose(
+        statistics.backend_claim_statistics(backend, filters).select_dtypes('number'),
+        statistics.backend_claim_statistics(pandas_backend, filters).select_dtypes('number')
+    )
+    assert backend.earned_loss_ratio(filters, valuation_date) == pytest.approx(
+        pandas_backend.earned_loss_ratio(filters, valuation_date))
+    np.testing.assert_allclose(
+        backend.earned_premium_by_period(filters, 'Q', valuation_date)[engine.premium_columns],
+        pandas_backend.earned_premium_by_period(filters, 'Q', valuation_date)[engine.premium_columns]
+    )
+    pd.testing.assert_frame_equal(
+        engine.development_triangle(backend.triangle_cells(filters)),
+        engine.development_triangle(pandas_backend.triangle_cells(filters))
+    )
+    page = backend.page(filters, 'Premi Gross', False, 0, 20)
+    np.testing.assert_allclose(page['Premi Gross'],
+                               pandas_backend.page(filters, 'Premi Gross', False, 0, 20)['Premi Gross'])
+
+def test_duckdb_backend_scans_parquet_sources(sources, pandas_backend, tmp_path):
+    pytest.importorskip('duckdb')
+    # Premi sebagai dua part inkremental (kolom sudah di-rename, tipe hasil parse berbeda),
+    # Klaim dan OS Klaim sebagai snapshot upload
+    premi = sources['Premi'].rename(columns=engine.rename_columns_premi)
+    paths = {'Premi': [str(tmp_path / "premi_part_0000.parquet"), str(tmp_path / "premi_part_0001.parquet")]}
+    engine.write_snapshot(premi.iloc[:1000], paths['Premi'][0])
+    engine.write_snapshot(premi.iloc[1000:].astype({'NO SERTIFIKAT': 'float64'}), paths['Premi'][1])
+    for sumber_data in ['Klaim', 'OS Klaim']:
+        paths[sumber_data] = str(tmp_path / f"{sumber_data}.parquet")
+        engine.write_snapshot(sources[sumber_data], paths[sumber_data])
+
+    backend = engine.DuckDBBackend(paths)
+    assert backend.n_rows == pandas_backend.n_rows
+    for filters in filter_sets.values():
+        assert backend.count(filters) == pandas_backend.count(filters)
+        aggregates, expected = backend.aggregate(filters), pandas_backend.aggregate(filters)
+        np.testing.assert_allclose(aggregates.totals[engine.additional_columns],
+                                   expected.totals[engine.additional_columns])
+        assert aggregates.claim_frequency == expected.claim_frequency
+
+def test_stage_records_peak_memory_of_freed_objects(monkeypatch):
+    # Tanpa ru_maxrss puncak harus tertangkap sampler walau array sudah dibebaskan saat tahap selesai
+    monkeypatch.setattr(engine, 'resource', None)
+    memory_before = engine.current_memory()
+    with engine.stage('alokasi') as record:
+        values = np.ones(25_000_000)
+        time.sleep(0.2)
+        del values
+    assert record['memory'] - max(memory_before, engine.current_memory()) > 100 * 2**20